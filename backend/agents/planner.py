@@ -1,8 +1,13 @@
 from backend.agents.base_agent import BaseAgent, AgentMessage
 from typing import List, Dict, Any
-from backend.mcts.simulator import Environment
+import asyncio
+import os
 from backend.mcts.search import Search
+from backend.mcts.evaluators import ExactEvaluator
+from backend.mcts.session import SearchSessionCache
+from backend.mcts.profiler import SearchProfiler
 from backend.agents.philosopher import PhilosopherAgent
+from backend.services.vector_store import VectorStore
 from backend.mcts.state import State
 class PlannerAgent(BaseAgent):
     """
@@ -13,11 +18,18 @@ class PlannerAgent(BaseAgent):
         - make_selection: select the best plan and return trade offs with the commander agent
     """
 
-    def __init__(self):
+    def __init__(self, vector_store: VectorStore = None):
         super().__init__(name="planner", role="planner") 
         self._current_plan = None # sets the plan to test
-        self.num_simulations = 1000
+        self.max_iterations = 1000 # simulation budget per planning request
+        self.time_budget_ms = 2000 # latency budget for the search per planning request
+        self.convergence_tol = 0.01 # stop early once the best action's visit share settles
+        self.num_workers = os.cpu_count() or 1 # processes used by the root-parallel search
         self.philosopher = PhilosopherAgent()
+        self.vector_store = vector_store or VectorStore() # embeds the actions (priors for progressive widening)
+        self.sessions = SearchSessionCache() # search trees kept between requests
+        self._search_lock = asyncio.Lock() # one search at a time, requests about the same decision share its tree
+        self.profile = os.environ.get("MCTS_PROFILE") == "1" # time the search phases of every request
     
     async def plan(self, message: AgentMessage):
         """ 
@@ -36,9 +48,11 @@ class PlannerAgent(BaseAgent):
             print("insights used in planning: ", insights)
             print("states used in planning: ", state.__dict__)  # Print full state details
 
-            # generate possible decisions
+            # generate possible decisions (a follow-up on a known decision keeps its actions so the tree is reused)
             try:
-                possible_actions = await self.philosopher.generate_actions(state, contexts, insights)
+                possible_actions = self.sessions.actions(state)
+                if possible_actions is None:
+                    possible_actions = await self.philosopher.generate_actions(state, contexts, insights)
                 print("possible actions: ", possible_actions)
             except Exception as e:
                 print(f"Error in philosopher.generate_actions: {str(e)}")
@@ -55,40 +69,66 @@ class PlannerAgent(BaseAgent):
                 print(f"Error classifying actions: {e}")
                 return ["Unable to process request - action classification failed"]
 
-            # initialize MCTS with fewer simulations for testing
-            self.num_simulations = 3  # Reduce from 1000 to 3 for testing
-            
+            # embed the actions: their similarity to the user's goal orders the children the search opens
             try:
-                env = Environment(state, constraints={})
-                search = Search(game=env)
+                action_embeddings = await self.vector_store.convert_embeddings(possible_actions)
+                state.action_embeddings = {
+                    action: embedding.tolist()
+                    for action, embedding in zip(possible_actions, action_embeddings)
+                    if embedding is not None
+                }
+            except Exception as e:
+                print(f"Error embedding actions: {e}")
+            # without action embeddings every prior is 0, widening would open children in the llm's order
+            widening_constant = 2.0 if state.action_embeddings else None
+
+            result = None
+            try:
+                # reuse the tree of an earlier request about the same decision
+                search = self.sessions.get(
+                    state,
+                    constraints={},
+                    factory=lambda env: Search(game=env, evaluator=ExactEvaluator(env), widening_constant=widening_constant,
+                                               memory_budget=64 * 1024 * 1024,
+                                               profiler=SearchProfiler() if self.profile else None)
+                )
+                self._current_plan = (state, possible_actions)
                 print("initialized MCTS with state: ", state)
                 
                 print("\nRunning simulations...")
-                for i in range(self.num_simulations):
-                    try:
-                        print(f"\nSimulation {i+1}:")
-                        
-                        search.explore()
-                        print(f"Simulation {i+1} completed")
-                        
+                try:
+                    # the search is cpu-bound, it runs in a thread so the event loop keeps serving other requests
+                    async with self._search_lock:
+                        result = await asyncio.to_thread(
+                            search.run,
+                            time_budget_ms=self.time_budget_ms,
+                            max_iterations=self.max_iterations,
+                            convergence_tol=self.convergence_tol,
+                            workers=self.num_workers
+                        )
+
                         # Print simulation results
+                        print(f"Ran {result.iterations} simulations in {result.elapsed_ms:.0f}ms ({result.stop_reason})")
                         print(f"Node visits: {search.root.visits}")
                         print(f"Node wins: {search.root.wins}")
-                        
-                    except Exception as e:
-                        import traceback
-                        print(f"Error in simulation {i}: {str(e)}")
-                        print("Full trace:")
-                        print(traceback.format_exc())
-                        continue
-                        
+                        if search.profiler is not None:
+                            print("search profile: ", search.profiler.summary())
+                            search.profiler.reset()
+
+                except Exception as e:
+                    import traceback
+                    print(f"Error in simulations: {str(e)}")
+                    print("Full trace:")
+                    print(traceback.format_exc())
+
             except Exception as e:
                 print(f"Error in MCTS setup: {str(e)}")
                 return ["Unable to generate optimal plan. Please try again."]
 
-            # get best paths - fallback to possible actions if no paths found
+            # get best paths (read at the end of the run, the tree may be searched again by now)
+            # - fallback to possible actions if no paths found
             try:
-                best_paths = search.get_best_paths()
+                best_paths = (result.best_paths if result is not None else None) or possible_actions
             except Exception as e:
                 print(f"Error getting best paths: {str(e)}")
                 best_paths = possible_actions  # Fallback to raw actions
@@ -106,3 +146,12 @@ class PlannerAgent(BaseAgent):
             print(f"Critical error in planning: {str(e)}")
             # Return a basic response rather than failing completely
             return ["Unable to generate optimal plan. Please try again."]
+
+    def commit_action(self, action: str):
+        """
+            The user committed to an action of the current plan: keep searching from the state after it
+        """
+        if self._current_plan is None:
+            return None
+        state, _ = self._current_plan
+        return self.sessions.commit(state, action)
@@ -13,9 +13,9 @@ class TranslatorAgent(BaseAgent):
         - process_output: processes the message and returns to frontend
     """
 
-    def __init__(self):
+    def __init__(self, vector_store: VectorStore = None):
         super().__init__(name="translator", role="translator")
-        self.vector_store = VectorStore()
+        self.vector_store = vector_store or VectorStore() # contexts are retrieved (and reinforced) from this store
         self.memory_store = MemoryStore()
     
     # Input workflow
@@ -39,19 +39,14 @@ class TranslatorAgent(BaseAgent):
             embeddings = await self.vector_store.convert_embedding(user_input)
             
             # Query for similar contexts but don't store current input
-            query_response = await self.vector_store.query_embedding(embeddings)
+            # (memories used often and recently rank slightly higher)
+            query_response = await self.vector_store.query_embedding(
+                embeddings, reinforcement_weight=0.1, recency_weight=0.05
+            )
             
             # Process query response and create a context list
             if isinstance(query_response, dict) and 'matches' in query_response:
-                similar_contexts = [
-                    {
-                        "id": match.get("id"),
-                        "text": match.get("metadata", {}).get("text", ""),
-                        "score": match.get("score", 0.0),
-                        "metadata": match.get("metadata", {})
-                    } 
-                    for match in query_response['matches']
-                ]
+                similar_contexts = await self._contexts(query_response['matches'])
                 print(f"Found {len(similar_contexts)} relevant contexts")
                 print(f"Context details: {similar_contexts}")
                 
@@ -77,6 +72,23 @@ class TranslatorAgent(BaseAgent):
             metadata={}
         )
     
+    async def _contexts(self, matches: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+            Contexts passed to the planner from the matches of a query (the matches are reinforced)
+        """
+        contexts = [
+            {
+                "id": match.get("id"),
+                "text": match.get("metadata", {}).get("text", ""),
+                "score": match.get("score", 0.0),
+                "metadata": match.get("metadata", {})
+            } 
+            for match in matches
+        ]
+        for context in contexts:
+            await self.vector_store.reinforce_memory(context["id"])
+        return contexts
+
     # Output workflow
     async def process_output_message(self, message: AgentMessage) -> AgentMessage:
         """ 
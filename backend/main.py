@@ -1,10 +1,15 @@
 # create fastapi server to handle requests
-from fastapi import FastAPI
+from typing import List, Optional
+import json
+from fastapi import FastAPI, HTTPException, Query
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from services.message_bus import MessageBus
 from agents.translator import TranslatorAgent
 from agents.planner import PlannerAgent
 from tests.context import JASMINE_CONTEXT
+from backend.services.openai_client import close_shared_client
+from backend.mcts.parallel import shutdown_pool
 
 app = FastAPI()
 
@@ -21,48 +26,90 @@ app.add_middleware(
 message_bus = MessageBus()
 
 # initialize agents
-translator_agent = TranslatorAgent()
-planner_agent = PlannerAgent()
+translator_agent = TranslatorAgent(vector_store=message_bus.vector_store)
+planner_agent = PlannerAgent(vector_store=message_bus.vector_store)
 
 # add test context to vector db
 async def init_vector_store():
-    for context in JASMINE_CONTEXT:
-        await message_bus.vector_store.store_embedding(
-            context["text"],
-            metadata={
-                "text": context["text"],
-                "category": context["category"],
-                "confidence": context["confidence"],
-                "timestamp": context["timestamp"]
-            }
+    # the store is persisted, only embed the context the first time
+    if len(message_bus.vector_store.metadata) or message_bus.vector_store.files.readonly:
+        return
+    try:
+        await message_bus.vector_store.store_embeddings(
+            [context["text"] for context in JASMINE_CONTEXT],
+            metadatas=[
+                {
+                    "text": context["text"],
+                    "category": context["category"],
+                    "confidence": context["confidence"],
+                    "timestamp": context.get("timestamp", 0.0)
+                }
+                for context in JASMINE_CONTEXT
+            ]
         )
+    finally:
+        await close_shared_client() # this event loop ends before the server starts
 
 #* implement subscribe functionality
 
+@app.on_event("shutdown")
+async def shutdown():
+    # close the pooled connections of the openai client
+    await close_shared_client()
+    # stop the worker processes of the root-parallel searches
+    shutdown_pool()
+
 @app.get("/")
 async def root():
     return {"message": "Hello World"}
 
 #* other routes
 # get context from vector db
+def _context_view(context: dict) -> dict:
+    # fields of a context sent to the frontend
+    return {
+        "id": context["id"],
+        "text": context.get("text", ""),
+        "category": context.get("category", "Unknown"),
+        "confidence": context.get("confidence", 0.0),
+        "timestamp": context.get("timestamp", 0.0)
+    }
+
 @app.get("/get_context")
-async def get_context():
+async def get_context(cursor: Optional[str] = None, limit: int = 100, category: Optional[List[str]] = Query(None),
+                      min_confidence: Optional[float] = None, start: Optional[float] = None,
+                      end: Optional[float] = None, stream: bool = False):
+    """
+        List stored contexts a page at a time: pass next_cursor back as cursor for the next page.
+        Filters: category (repeatable), min_confidence, start / end timestamps.
+        stream=true sends every context from the cursor on as NDJSON (one context per line) instead
+    """
+    # reject malformed cursors before streaming starts
     try:
-        # query all vectors from vector db
-        query_result = await message_bus.vector_store.query_embedding([], top_k=100) 
+        valid = cursor is None or int(cursor) >= 0
+    except ValueError:
+        valid = False
+    if not valid:
+        raise HTTPException(status_code=400, detail=f"Invalid cursor: {cursor}")
 
-        # extract only text and category from the query result
-        contexts = [
-            {
-                "text": match["text"],
-                "category": match["metadata"].get("category", "Unknown"),
-                "confidence": match["metadata"].get("confidence", 0.0),
-                "timestamp": match["metadata"].get("timestamp", 0.0)
-            }
-            for match in query_result.get("matches", [])
-        ] if query_result and "matches" in query_result else []
-
-        return {"contexts": contexts}
+    try:
+        filters = {
+            "categories": category,
+            "min_confidence": min_confidence,
+            "timestamp_range": (start, end) if start is not None or end is not None else None
+        }
+        if stream:
+            # sync generator, the server iterates it in a thread so record reads don't block the event loop
+            def lines():
+                for context in message_bus.vector_store.iter_contexts(cursor=cursor, **filters):
+                    yield json.dumps(_context_view(context)) + "\n"
+            return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+        page = message_bus.vector_store.list_contexts(cursor=cursor, limit=max(1, min(limit, 1000)), **filters)
+        return {
+            "contexts": [_context_view(context) for context in page["contexts"]],
+            "next_cursor": page["next_cursor"]
+        }
     except Exception as e:
         return {"error": str(e)}
 
@@ -101,6 +148,38 @@ async def add_context(context: dict):
         }
     except Exception as e:
         return {"status": "error", "message": str(e)}
+
+# add many contexts to vector db (embedded in batches)
+@app.post("/add_contexts")
+async def add_contexts(contexts: List[dict]):
+    try:
+        # Validate required fields
+        missing = [i for i, context in enumerate(contexts) if "text" not in context]
+        if missing:
+            return {"status": "error", "message": f"Missing required field: text (contexts {missing})"}
+
+        metadatas = [
+            {
+                "text": context["text"],
+                "category": context.get("category", "Unknown"),
+                "confidence": context.get("confidence", 0.0),
+                "timestamp": context.get("timestamp", 0.0)
+            }
+            for context in contexts
+        ]
+        stored_ids = await message_bus.vector_store.store_embeddings(
+            [context["text"] for context in contexts],
+            metadatas=metadatas
+        )
+
+        return {
+            "status": "success",
+            "stored": sum(1 for stored_id in stored_ids if stored_id),
+            "failed": sum(1 for stored_id in stored_ids if not stored_id),
+            "ids": stored_ids
+        }
+    except Exception as e:
+        return {"status": "error", "message": str(e)}
     
 
 if __name__ == "__main__":
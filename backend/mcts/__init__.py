@@ -1,12 +1,31 @@
 from .node import Node
 from .state import State
-from .search import Search
+from .search import Search, SearchResult
 from .simulator import Environment
+from .tree import Tree
+from .rollout import RolloutEngine
+from .evaluators import LeafEvaluator, RandomRolloutEvaluator, ExactEvaluator, CachedEvaluator
+from .transposition import TranspositionTable
+from .session import SearchSessionCache
+from .serialize import save_tree, load_tree
+from .profiler import SearchProfiler
 
 # export all classes to use in planner agent
 __all__ = [
     'Node',
     'State',
     'Search',
-    'Environment'
+    'SearchResult',
+    'Environment',
+    'Tree',
+    'RolloutEngine',
+    'LeafEvaluator',
+    'RandomRolloutEvaluator',
+    'ExactEvaluator',
+    'CachedEvaluator',
+    'TranspositionTable',
+    'SearchSessionCache',
+    'save_tree',
+    'load_tree',
+    'SearchProfiler'
 ]
\ No newline at end of file
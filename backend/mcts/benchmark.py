@@ -0,0 +1,232 @@
+# benchmark suite for the search on synthetic games (no LLM involved)
+# usage: python -m backend.mcts.benchmark --output results.json --baseline baseline.json
+from dataclasses import dataclass, asdict, replace
+from typing import Dict, List, Optional, Tuple
+import argparse
+import json
+import sys
+import time
+import tracemalloc
+import numpy as np
+from .state import State
+from .simulator import Environment
+from .search import Search
+from .evaluators import ExactEvaluator
+from .rollout import RolloutEngine
+from .profiler import SearchProfiler
+
+@dataclass
+class BenchmarkCase:
+    """
+    Synthetic decision to search
+    - branching: number of possible actions
+    - depth: number of actions played before the game ends (horizon)
+    - embedding_dim: size of the goal and action embeddings
+    - high_risk_fraction, long_term_fraction: share of actions penalized by the reward (reward structure)
+    - evaluator: leaf evaluator ("random", "batched" or "exact")
+    """
+    name: str
+    branching: int = 8
+    depth: int = 4
+    embedding_dim: int = 64
+    high_risk_fraction: float = 0.3
+    long_term_fraction: float = 0.3
+    evaluator: str = "random"
+    widening_constant: Optional[float] = None
+    iterations: int = 2000
+    seed: int = 0
+
+# default suite: a narrow and deep game, a wide and shallow one, the wide one with widening, large embeddings
+SUITE = [
+    BenchmarkCase("narrow-deep", branching=4, depth=10),
+    BenchmarkCase("wide-shallow", branching=64, depth=3),
+    BenchmarkCase("wide-widening", branching=64, depth=3, widening_constant=2.0),
+    BenchmarkCase("large-embeddings", branching=16, depth=4, embedding_dim=1536),
+    BenchmarkCase("exact-evaluator", branching=16, depth=6, evaluator="exact"),
+]
+
+# metrics where a higher value is better (the rest are lower is better)
+HIGHER_IS_BETTER = {"iterations_per_sec"}
+
+def make_environment(case: BenchmarkCase) -> Environment:
+    """
+        Build the synthetic environment of a case. Actions and embeddings are drawn from the case's seed,
+        so every run of a case searches the same game
+    """
+    rng = np.random.default_rng(case.seed)
+    actions = [f"action-{i}" for i in range(case.branching)]
+    state = State(
+        description=f"benchmark {case.name}",
+        attributes={"risk": 0.3, "time-constraint": 0.6, "importance": 0.7},
+        embedding=rng.normal(size=case.embedding_dim).tolist(),
+        actions=actions,
+        action_embeddings={a: rng.normal(size=case.embedding_dim).tolist() for a in actions},
+    )
+    for action in actions:
+        state.action_metadata[action] = {
+            'is_high_risk': bool(rng.random() < case.high_risk_fraction),
+            'is_long_term': bool(rng.random() < case.long_term_fraction),
+        }
+    game = Environment(state, constraints={})
+    game.horizon = case.depth
+    return game
+
+def make_search(case: BenchmarkCase, game: Environment) -> Search:
+    evaluators = {
+        "random": lambda: None,
+        "batched": lambda: RolloutEngine(game, num_rollouts=64, seed=case.seed),
+        "exact": lambda: ExactEvaluator(game),
+    }
+    return Search(game, seed=case.seed, evaluator=evaluators[case.evaluator](), widening_constant=case.widening_constant)
+
+# phase times reported by the profiler (medians over the repeated runs of a case)
+PHASES = ("select_ms", "expand_ms", "rollout_ms", "backprop_ms")
+
+def _throughput(case: BenchmarkCase) -> float:
+    """
+        Iterations per second of a search run without a profiler (timing the phases slows the search down)
+    """
+    search = make_search(case, make_environment(case))
+    start = time.perf_counter_ns()
+    for _ in range(case.iterations):
+        search.explore()
+    elapsed = (time.perf_counter_ns() - start) / 1e9
+    return case.iterations / elapsed if elapsed > 0 else float('inf')
+
+def _profiled_run(case: BenchmarkCase, check_every: int = 50) -> Dict[str, float]:
+    """
+        Run the search with a profiler attached to time each phase. The most visited root child is
+        recorded every check_every iterations to measure how fast the decision settles
+    """
+    game = make_environment(case)
+    search = make_search(case, game)
+    search.profiler = SearchProfiler()
+    best = []
+
+    for i in range(1, case.iterations + 1):
+        search.explore()
+        if i % check_every == 0:
+            best.append(int(search.tree.most_visited_child(0)))
+
+    # iterations until the most visited root child stopped changing
+    settled = len(best)
+    while settled > 0 and best[settled - 1] == best[-1]:
+        settled -= 1
+    best_share = search._best_visit_share()
+    profile = search.profiler.summary()
+
+    return {
+        "select_ms": profile["select_ms"],
+        "expand_ms": profile["expand_ms"],
+        "rollout_ms": profile["evaluate_ms"],
+        "backprop_ms": profile["backpropagate_ms"],
+        "nodes": int(search.tree.size),
+        "max_depth": profile["max_depth"],
+        "mean_rollout_steps": profile["mean_rollout_steps"],
+        "convergence_iterations": settled * check_every,
+        "best_visit_share": best_share[1] if best_share else 0.0,
+    }
+
+def _timed_iterations(case: BenchmarkCase, repeats: int = 5) -> Tuple[Dict[str, float], Dict[str, float]]:
+    """
+        Throughput and phase times of a case over repeats runs (a single run is too noisy to gate on).
+        Throughput is timed in runs of its own, without the profiler
+        - returns: (metrics with the median of the timed ones, best value of each timed metric)
+    """
+    runs = [_profiled_run(case) for _ in range(repeats)]
+    throughputs = [_throughput(case) for _ in range(repeats)]
+    metrics = {"iterations_per_sec": float(np.median(throughputs))}
+    metrics.update(runs[0]) # the search is seeded, every run grows the same tree
+    best = {"iterations_per_sec": float(max(throughputs))}
+    for phase in PHASES:
+        metrics[phase] = float(np.median([run[phase] for run in runs]))
+        best[phase] = float(min(run[phase] for run in runs))
+    return metrics, best
+
+def _peak_memory(case: BenchmarkCase) -> Dict[str, float]:
+    """
+        Peak traced memory of a search run (measured separately, tracing slows the search down)
+    """
+    tracemalloc.start()
+    try:
+        game = make_environment(case)
+        search = make_search(case, game)
+        tracemalloc.reset_peak()
+        for _ in range(case.iterations):
+            search.explore()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {"peak_bytes": peak, "bytes_per_node": peak / max(search.tree.size, 1)}
+
+def run_case(case: BenchmarkCase, repeats: int = 5) -> Dict:
+    """
+        Benchmark one case and return its configuration, metrics and best timed metrics
+        - repeats: runs the timed metrics are measured over
+    """
+    metrics, best = _timed_iterations(case, repeats)
+    metrics.update(_peak_memory(case))
+    return {"case": asdict(case), "metrics": metrics, "best": best}
+
+def run_suite(cases: List[BenchmarkCase] = None, repeats: int = 5) -> Dict[str, Dict]:
+    return {case.name: run_case(case, repeats) for case in (cases or SUITE)}
+
+def compare(results: Dict[str, Dict], baseline: Dict[str, Dict], tolerance: float = 0.3) -> List[str]:
+    """
+        Compare results against a baseline run and return the regressions
+        - tolerance: relative change allowed before a metric counts as a regression
+        a timed metric regresses when even the best of the new runs is worse than the baseline's median:
+        a slower build slows every run, a noisy machine only some of them
+    """
+    regressions = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        before = baseline[name]["metrics"]
+        after = dict(result["metrics"], **result.get("best", {}))
+        for metric in ("iterations_per_sec",) + PHASES + ("bytes_per_node",):
+            old, new = before.get(metric), after.get(metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            if metric in HIGHER_IS_BETTER:
+                change = -change
+            if change > tolerance:
+                regressions.append(f"{name}: {metric} {old:.4g} -> {new:.4g} ({change:+.1%} worse)")
+    return regressions
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the MCTS search on synthetic games")
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    parser.add_argument("--baseline", help="JSON results of an earlier run to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.3, help="relative slowdown allowed (default 0.3)")
+    parser.add_argument("--iterations", type=int, help="override the iterations of every case")
+    parser.add_argument("--case", action="append", help="only run the named cases")
+    parser.add_argument("--repeats", type=int, default=5, help="runs each timed metric is measured over (default 5)")
+    args = parser.parse_args(argv)
+
+    cases = [case for case in SUITE if not args.case or case.name in args.case]
+    if args.iterations:
+        cases = [replace(case, iterations=args.iterations) for case in cases]
+
+    results = run_suite(cases, args.repeats)
+    for name, result in results.items():
+        m = result["metrics"]
+        print(f"{name:20s} {m['iterations_per_sec']:10.0f} it/s  select {m['select_ms']:8.1f}ms  "
+              f"expand {m['expand_ms']:8.1f}ms  rollout {m['rollout_ms']:8.1f}ms  backprop {m['backprop_ms']:8.1f}ms  "
+              f"{m['bytes_per_node']:8.0f} B/node  converged after {m['convergence_iterations']} it")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for regression in regressions:
+            print(f"regression: {regression}")
+        return 1 if regressions else 0
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
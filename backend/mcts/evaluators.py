@@ -0,0 +1,112 @@
+# leaf evaluators estimating the value of a game state for the search
+from abc import ABC, abstractmethod
+from collections import Counter, OrderedDict
+from typing import Optional
+import threading
+import numpy as np
+
+class LeafEvaluator(ABC):
+    """
+        Interface for estimating the expected return from the current state of a game to its end
+        - evaluate: value of the game's current state (must leave the game as it found it)
+        - reset: called when the game's rewards change so precomputed values can be rebuilt
+    """
+
+    @abstractmethod
+    def evaluate(self, game, rng: Optional[np.random.Generator] = None) -> float:
+        pass
+
+    def reset(self, game):
+        pass
+
+class RandomRolloutEvaluator(LeafEvaluator):
+    """
+        Plays one random game to the end on the environment and undoes it (the classic rollout)
+    """
+
+    def evaluate(self, game, rng: Optional[np.random.Generator] = None) -> float:
+        wins = 0
+        steps = 0
+        done = game.done
+        try:
+            while not done:
+                action = game.get_action(rng)
+                _, reward, done = game.step(action)
+                wins += reward
+                steps += 1
+        finally:
+            # the game is the caller's, leave it as it was even if a step fails
+            game.undo(steps)
+        return wins
+
+class ExactEvaluator(LeafEvaluator):
+    """
+        Expected return of a uniformly random rollout in closed form. With additive rewards every
+        remaining step is worth the mean action reward on average, so the value is
+        remaining steps * mean reward: zero variance and O(1) per leaf
+    """
+    def __init__(self, game):
+        self.reset(game)
+
+    def reset(self, game):
+        if not getattr(game, 'additive_rewards', False):
+            raise ValueError("ExactEvaluator needs an environment with additive rewards")
+        rewards = game.reward_vector()
+        self.mean_reward = float(rewards.mean()) if len(rewards) else 0.0
+
+    def evaluate(self, game, rng: Optional[np.random.Generator] = None) -> float:
+        return game.remaining_steps() * self.mean_reward
+
+class CachedEvaluator(LeafEvaluator):
+    """
+        Memoizes another evaluator per game state (least recently used entries are evicted).
+        The state is the action history as a multiset or a sequence, following the environment's semantics.
+        The cache is locked, so tree-parallel threads can share it (the wrapped evaluator runs unlocked)
+    """
+    def __init__(self, evaluator: LeafEvaluator, max_entries: int = 100_000):
+        self.evaluator = evaluator
+        self.max_entries = max_entries
+        self._values: "OrderedDict[object, float]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __getstate__(self):
+        # locks can't be pickled (root-parallel workers get a copy of the evaluator)
+        state = self.__dict__.copy()
+        del state['_lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def state_key(game):
+        history = game.state.history
+        if getattr(game, 'history_semantics', 'sequence') == 'multiset':
+            return frozenset(Counter(history).items())
+        return tuple(history)
+
+    def reset(self, game):
+        with self._lock:
+            self._values.clear()
+        self.evaluator.reset(game)
+
+    def evaluate(self, game, rng: Optional[np.random.Generator] = None) -> float:
+        key = self.state_key(game)
+        with self._lock:
+            value = self._values.get(key)
+            if value is not None:
+                self._values.move_to_end(key)
+                self.hits += 1
+                return value
+            self.misses += 1
+
+        value = self.evaluator.evaluate(game, rng)
+        with self._lock:
+            self._values[key] = value
+            self._values.move_to_end(key)
+            while len(self._values) > self.max_entries:
+                self._values.popitem(last=False)
+        return value
@@ -1,86 +1,94 @@
 # nodes on the tree representing a state
-from dataclasses import dataclass, field
-from typing import List, Optional, Dict, Any
+from typing import Dict, Optional
 import math
-from sklearn.metrics.pairwise import cosine_similarity
+from .tree import Tree
 
-@dataclass
 class Node:
     """
-    Information each node holds and methods to interact with it
+    View over one node of the array-backed search tree. The statistics live in the tree,
+    so creating a node view is cheap and holds no copy of the game
     Actions:
     - add child node
     - calculate ucb score of node using embeddings
     """
-    def __init__(self, game, done, parent, action_index):
-        self.child = []                             # list of child nodes 
-        self.parent = parent                        # parent node
-        self.state = None                           # state of the node
-        self.game = game                            # set up the environment to play the game
-        self.visits = 0                             # number of times the node has been visited
-        self.wins = 0                               # number of rewards from exploration
-        self.value = 0                              # average value of the node
-        self.action_index = action_index            # index of the action that led to this node
-        self.done = done                            # whether the node is terminal
-    
+    __slots__ = ('tree', 'index', '_root_game')
+
+    def __init__(self, tree: Tree, index: int, root_game=None):
+        self.tree = tree                            # tree holding the node statistics
+        self.index = index                          # row of the node in the tree arrays
+        self._root_game = root_game                 # environment at the root of the tree
+
+    @property
+    def parent(self) -> Optional['Node']:
+        parent = int(self.tree.parent[self.index])
+        return Node(self.tree, parent, self._root_game) if parent >= 0 else None
+
+    @property
+    def child(self) -> Dict[str, 'Node']:
+        """ child nodes keyed by the action that leads to them """
+        tree = self.tree
+        return {
+            tree.actions[tree.action[i]]: Node(tree, int(i), self._root_game)
+            for i in tree.children(self.index)
+        }
+
+    @property
+    def game(self):
+        """ environment at this node, replayed from the root """
+        game = self._root_game.copy()
+        for action in self.tree.path_actions(self.index):
+            game.step(action)
+        return game
+
+    @property
+    def visits(self) -> int:
+        return int(self.tree.visits[self.index])
+
+    @property
+    def wins(self) -> float:
+        return float(self.tree.value[self.index])
+
+    @property
+    def value(self) -> float:
+        return self.wins / self.visits if self.visits else 0.0
+
+    @property
+    def action_index(self) -> Optional[str]:
+        action = int(self.tree.action[self.index])
+        return self.tree.actions[action] if action >= 0 else None
+
+    @property
+    def done(self) -> bool:
+        return bool(self.tree.done[self.index])
+
     def create_child(self):
         """
-        Create a child node for each possible action and test it in a simulation to get a score
+        Create a child node for each possible action
         """
         if self.done:
             return
-        
-        # play a simulation for each action
-        actions = []
-        games = []
-        for i in self.game.get_actions():
-            actions.append(i)
-            new_game = self.game.copy()
-            games.append(new_game)
-        
-        # run the simulations on the actions and game environments
-        child = {}
-        for action, game in zip(actions, games):
-            child[action] = Node(game, done = game.done, parent = self, action_index = action)
-        
-        # add ALL child nodes and results of the game to the current node 
-        self.child = child
-    
+        self.tree.expand(self.index, self.game.get_actions())
+
     def get_ucb_score(self, exploration_constant: float = 1.41) -> float:
-        """ 
+        """
         Calculate the UCB score to inform the selection of the best node
-        - state embedding: context of the user's background
-        - goal embedding: context of the user's goals
-        - user preferences: extracted from user input (ex: risk-aversion)
+        - exploitation and exploration from the visit statistics
+        - static bonus stored on the node when it was created: similarity of the action to the
+          goal embedding plus the user preferences (ex: risk-aversion), see Environment.action_bonus
         """
         # if the node has not been visited (favor exploration)
         if self.visits == 0:
             return float('inf')
-        
-        # calculate the exploration and exploitation
+
+        # calculate the exploitation and exploration
         # ubc formula
-        exploration = self.value / self.visits
-        exploitation = exploration_constant * math.sqrt(
-            math.log(self.parent.visits) / self.visits
+        parent = self.parent
+        parent_visits = max(parent.visits if parent else self.visits, 1)
+        exploitation = self.wins / self.visits
+        exploration = exploration_constant * math.sqrt(
+            math.log(parent_visits) / self.visits
         )
 
-        # extract embeddings 
-        embedding_bonus = 0.0 # bonus added to score 
-        if hasattr(self.state, "embedding") and hasattr(self.game, 'goal_embedding'):
-            similarity = cosine_similarity(
-                self.state.embedding,
-                self.game.goal_embedding
-            )
-            embedding_bonus = similarity * 0.5 # importance of user context
-        
-        # add user preferences to weighting
-        preference_bonus = 0.0
-        if hasattr(self.state, 'attributes'):
-            preferences = self.game.user_preferences # dict of attribute weights
-            for attr, weight in preferences.items():
-                if attr in self.state.attributes: 
-                    preference_bonus += self.state.attributes[attr] * weight
-
         # calculate the score
-        score = exploitation + exploration + embedding_bonus + preference_bonus
-        return score
\ No newline at end of file
+        score = exploitation + exploration + float(self.tree.bonus[self.index])
+        return score
@@ -0,0 +1,168 @@
+# parallel search strategies spreading the simulations of one search across cores
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import List, Optional, Tuple
+import copy
+import threading
+import time
+import numpy as np
+from .tree import Tree
+from .profiler import SearchProfiler
+
+# worker processes shared by the root-parallel runs of the process, started on first use
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_workers = 0
+_pool_lock = threading.Lock()
+
+def _executor(workers: int) -> ProcessPoolExecutor:
+    """
+        The shared process pool, restarted with more processes when a run needs more workers than it has
+    """
+    global _pool, _pool_workers
+    with _pool_lock:
+        if _pool is None or _pool_workers < workers:
+            if _pool is not None:
+                _pool.shutdown(wait=False) # runs already submitted to it finish
+            _pool = ProcessPoolExecutor(max_workers=workers)
+            _pool_workers = workers
+        return _pool
+
+def _discard_pool(executor: ProcessPoolExecutor):
+    global _pool, _pool_workers
+    with _pool_lock:
+        if _pool is executor:
+            _pool = None
+            _pool_workers = 0
+
+def shutdown_pool():
+    """
+        Stop the shared worker processes (on server shutdown), the next root-parallel run starts a new pool
+    """
+    global _pool, _pool_workers
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown()
+        _pool = None
+        _pool_workers = 0
+
+def _split(iterations: int, workers: int) -> List[int]:
+    """
+        Split the iterations as evenly as possible between the workers
+    """
+    base, extra = divmod(iterations, workers)
+    return [base + (1 if i < extra else 0) for i in range(workers)]
+
+def _seeds(search, workers: int) -> List[int]:
+    """
+        Draw one independent seed per worker from the search's random stream
+    """
+    entropy = int(search.rng.integers(2**63))
+    children = np.random.SeedSequence(entropy).spawn(workers)
+    return [int(child.generate_state(1, dtype=np.uint64)[0]) for child in children]
+
+def _root_worker(args: Tuple) -> Tuple[Tree, "SearchResult", Optional[SearchProfiler]]:
+    """
+        Run an independent search in a worker process and return its tree, run result and profiler
+    """
+    search, budget, deadline = args
+    if deadline is not None:
+        # process start-up counts against the time budget
+        budget['time_budget_ms'] = max((deadline - time.time()) * 1000, 0.0)
+    seed = search.tree.extract(0, capacity=search.tree.size) if search.tree.visits[0] else None
+    result = search.run(**budget)
+    if seed is not None:
+        # the warm-start statistics are already in the caller's tree, send back only the new ones
+        search.tree.subtract(seed)
+    return search.tree, result, search.profiler
+
+def run_root_parallel(search, workers: int, iterations: Optional[int] = None, time_budget_ms: Optional[float] = None,
+                      convergence_tol: Optional[float] = None) -> List["SearchResult"]:
+    """
+        Root parallelism: every worker grows its own tree from the root with its own random stream,
+        then the trees are merged into the search's tree (visits and values are summed per node).
+        Workers start from a copy of the search's tree, so a warm tree guides their selection, and
+        only the statistics they add are merged back
+        - iterations: total simulation budget split between the workers
+        - time_budget_ms: wall-clock budget shared by all workers
+        - returns: run result of every worker (iterations, why it stopped)
+    """
+    deadline = time.time() + time_budget_ms / 1000 if time_budget_ms is not None else None
+    counts = _split(iterations, workers) if iterations is not None else [None] * workers
+
+    jobs = []
+    for seed, count in zip(_seeds(search, workers), counts):
+        worker = copy.copy(search)
+        worker.rng = np.random.default_rng(seed)
+        worker.tree = search.tree.extract(0, capacity=search._capacity)
+        if worker.tree.visits[0]:
+            # a collapsed subtree would lose the seed statistics the worker subtracts before returning,
+            # so a warm worker doesn't prune (its tree only lives for this run, the merged tree is pruned)
+            worker._max_nodes = None
+        worker.profiler = SearchProfiler() if search.profiler is not None else None
+        budget = {"max_iterations": count, "time_budget_ms": time_budget_ms, "convergence_tol": convergence_tol}
+        jobs.append((worker, budget, deadline))
+
+    results = []
+    executor = _executor(workers)
+    try:
+        outcomes = list(executor.map(_root_worker, jobs))
+    except BrokenProcessPool:
+        _discard_pool(executor) # a worker process died, the next run starts a new pool
+        raise
+    for tree, result, profiler in outcomes:
+        search.tree.merge(tree)
+        if search._max_nodes is not None and search.tree.size > search._max_nodes:
+            search.prune() # the merged trees are bounded by the same memory budget as a serial search
+        results.append(result)
+        if search.profiler is not None:
+            search.profiler.merge(profiler)
+    return results
+
+def _tree_worker(search, iterations: int, seed: int, lock: threading.Lock):
+    """
+        Run simulations on the shared tree. Selection and expansion hold the lock and mark the path
+        with a virtual loss so other workers are steered to different branches while the leaf is evaluated
+    """
+    rng = np.random.default_rng(seed)
+    tree = search.tree
+    game = search.game.copy() # each worker steps and undoes its own copy
+    for _ in range(iterations):
+        path = [0]
+        rewards = []
+        with lock:
+            search._select(game, path, rewards, rng)
+            search._expand(game, path, rewards, rng)
+            tree.virtual[path] += 1
+            action_ids = tree.action[path[1:]].tolist()
+            garbage = tree.garbage
+            # the transposition table writes to the tree, only the evaluator runs unlocked
+            leaf_value = search._known_value(path[-1])
+
+        try:
+            if leaf_value is None:
+                leaf_value = search.evaluator.evaluate(game, rng)
+        finally:
+            game.undo(len(rewards))
+
+        with lock:
+            if tree.garbage != garbage:
+                # another worker widened a node and moved its children while the leaf was evaluated
+                path = tree.locate(action_ids)
+            tree.virtual[path] -= 1
+            search._backpropagate(path, rewards, leaf_value)
+
+def run_tree_parallel(search, iterations: int, workers: int, virtual_loss: float = 1.0):
+    """
+        Tree parallelism: workers share the search's tree in threads and use virtual loss to spread out.
+        Leaf evaluation runs outside the lock, so the speedup comes from evaluators that release the GIL
+        (the evaluator is shared between the threads and must be thread-safe, the provided ones are)
+    """
+    lock = threading.Lock()
+    search.tree.virtual_loss = virtual_loss
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [
+            executor.submit(_tree_worker, search, count, seed, lock)
+            for seed, count in zip(_seeds(search, workers), _split(iterations, workers))
+        ]
+        for future in futures:
+            future.result()
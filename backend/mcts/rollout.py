@@ -0,0 +1,51 @@
+# batched rollout engine simulating many random games at once with numpy
+from typing import Optional
+import numpy as np
+from .evaluators import LeafEvaluator
+
+class RolloutEngine(LeafEvaluator):
+    """
+        Simulates a batch of random rollouts in one pass instead of stepping the environment action by action.
+        Rewards only depend on the action taken, so a rollout is a row of sampled action indices and
+        its return is the sum of the per-action rewards looked up from the environment's reward vector
+        Functions:
+        - simulate: returns of num_rollouts random games played from the current state of a game
+        - evaluate: mean return, used by the search as the value of a leaf node
+    """
+    max_batch_elements = 1 << 22 # cap on sampled actions held in memory at once
+
+    def __init__(self, game, num_rollouts: int = 1024, seed: Optional[int] = None):
+        self.rewards = game.reward_vector()        # reward per action index
+        self.num_rollouts = num_rollouts           # rollouts simulated per evaluation
+        self.rng = np.random.default_rng(seed)
+
+    def reset(self, game):
+        self.rewards = game.reward_vector()
+
+    def simulate(self, game, num_rollouts: Optional[int] = None, rng: Optional[np.random.Generator] = None) -> np.ndarray:
+        """
+            Play random rollouts from the current state of the game without modifying it
+            - game: environment to simulate from
+            - num_rollouts: number of rollouts (defaults to self.num_rollouts)
+            - returns: array with the return of every rollout
+        """
+        num_rollouts = num_rollouts or self.num_rollouts
+        rng = rng or self.rng
+        steps = game.remaining_steps()
+        returns = np.zeros(num_rollouts, dtype=np.float64)
+        if steps == 0 or len(self.rewards) == 0:
+            return returns
+
+        # sample the action sequences as an integer matrix (one row per rollout) in bounded chunks
+        chunk = max(self.max_batch_elements // steps, 1)
+        for start in range(0, num_rollouts, chunk):
+            end = min(start + chunk, num_rollouts)
+            actions = rng.integers(0, len(self.rewards), size=(end - start, steps))
+            returns[start:end] = self.rewards[actions].sum(axis=1)
+        return returns
+
+    def evaluate(self, game, rng: Optional[np.random.Generator] = None) -> float:
+        """
+            Mean return of a batch of rollouts from the current state of the game
+        """
+        return float(self.simulate(game, rng=rng).mean())
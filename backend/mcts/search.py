@@ -1,16 +1,59 @@
 # main search algorithm implementation defining the strategy for winning the game
+from collections import Counter
 from dataclasses import dataclass
-from typing import Any
+from typing import List, Optional, Tuple
+import math
+import os
+import time
+import numpy as np
 from .node import Node
-import random
+from .tree import Tree
+from .evaluators import LeafEvaluator, RandomRolloutEvaluator
+from .transposition import TranspositionTable
+from .serialize import save_tree, load_tree
+from .profiler import SearchProfiler
 
 @dataclass
+class SearchResult:
+    """
+    Outcome of an anytime search run
+    """
+    best_paths: List[List[str]] # most visited action sequences from the root
+    iterations: int             # simulations that actually ran
+    elapsed_ms: float           # wall-clock time spent searching
+    converged: bool             # whether the visit share of the best child stabilized
+    stop_reason: str            # "iterations", "time", "converged" or "terminal"
+
 class Search:
-    def __init__(self, game, exploration_constant: float = 1.41, done: bool = False):
+    def __init__(self, game, exploration_constant: float = 1.41, done: bool = False, seed: Optional[int] = None,
+                 evaluator: Optional[LeafEvaluator] = None, transpositions: Optional[TranspositionTable] = None,
+                 widening_constant: Optional[float] = None, widening_exponent: float = 0.5,
+                 memory_budget: Optional[int] = None, prune_fraction: float = 0.5,
+                 profiler: Optional[SearchProfiler] = None):
         self.game = game
         self.exploration_constant = exploration_constant
-        self.root = Node(game, done, parent=None, action_index=None)
-    
+        self.widening_constant = widening_constant # progressive widening: children open = c * visits^exponent
+        self.widening_exponent = widening_exponent # (None opens every child at once)
+        self.evaluator = evaluator or RandomRolloutEvaluator() # estimates the value of leaf nodes
+        self.transpositions = transpositions # shares statistics between nodes reaching the same state
+        self.memory_budget = memory_budget # bytes the tree arrays may use (None for no limit)
+        self.prune_fraction = prune_fraction # share of the budget's nodes kept when the tree is pruned
+        self.prunes = 0 # number of times the tree was pruned
+        self.profiler = profiler # per-phase timings and counters (None disables instrumentation)
+        self.rng = np.random.default_rng(seed)
+        self._order = None # order in which actions become children (see _widen)
+        semantics = getattr(game, 'history_semantics', 'sequence')
+        row_bytes = Tree(capacity=1, semantics=semantics).row_bytes
+        self._max_nodes = memory_budget // row_bytes if memory_budget is not None else None
+        self._capacity = min(1024, self._max_nodes) if self._max_nodes is not None else 1024 # rows of a new tree
+        self.tree = Tree(capacity=self._capacity, semantics=semantics)
+        self.tree.done[0] = done or game.done
+        self._headroom = len(game.get_actions()) # most nodes a single iteration can add
+
+    @property
+    def root(self) -> Node:
+        return Node(self.tree, 0, self.game)
+
     def explore(self):
         """
             Explore the game tree by selecting nodes
@@ -22,66 +65,373 @@ class Search:
             - a leaf node has no children
 
         """
-        # Start from root node instead of self
-        current = self.root
+        game = self.game  # stepped in place along the selected path and undone afterwards
+        path = [0]        # start from the root node
+        rewards = []
+
+        # prune before the tree has to grow past the memory budget
+        if self._max_nodes is not None and self.tree.size + self._headroom > self._max_nodes:
+            self.prune()
+
+        if self.profiler is not None:
+            return self._explore_profiled(game, path, rewards)
+
+        try:
+            self._select(game, path, rewards, self.rng)
+            self._expand(game, path, rewards, self.rng)
+            leaf_value = self._evaluate(game, path[-1], self.rng)
+        finally:
+            game.undo(len(rewards))
+
+        #* backpropagation: backpropagate the results of the sim from the leaf node to the root
+        self._backpropagate(path, rewards, leaf_value)
+
+    def _explore_profiled(self, game, path: List[int], rewards: List[float]):
+        """
+            explore with every phase timed and the iteration counters recorded on the profiler
+        """
+        profiler = self.profiler
+        clock = profiler.clock
+        size = self.tree.size
+        try:
+            start = clock()
+            self._select(game, path, rewards, self.rng)
+            selected = clock()
+            profiler.record('select', selected - start)
+            self._expand(game, path, rewards, self.rng)
+            expanded = clock()
+            profiler.record('expand', expanded - selected)
+            rollout_steps = game.remaining_steps() if not self.tree.done[path[-1]] else 0
+            leaf_value = self._evaluate(game, path[-1], self.rng)
+            profiler.record('evaluate', clock() - expanded)
+        finally:
+            game.undo(len(rewards))
+
+        start = clock()
+        self._backpropagate(path, rewards, leaf_value)
+        profiler.record('backpropagate', clock() - start)
+        profiler.record_iteration(depth=len(path) - 1, nodes_created=self.tree.size - size, rollout_steps=rollout_steps)
+
+    def run(self, time_budget_ms: Optional[float] = None, max_iterations: Optional[int] = None,
+            convergence_tol: Optional[float] = None, check_every: int = 50, patience: int = 3,
+            workers: int = 1, num_paths: int = 3) -> SearchResult:
+        """
+            Anytime search: explore until a budget runs out and return the best paths found so far
+            - time_budget_ms: wall-clock budget
+            - max_iterations: simulation budget
+            - convergence_tol: stop early once the best root child's visit share moves by less than
+                               this between checks, for patience checks in a row
+            - check_every: iterations between convergence checks
+            - workers: number of processes for a root-parallel run. max_iterations is the total, split
+                       between the workers, time_budget_ms applies to every worker
+        """
+        if time_budget_ms is None and max_iterations is None:
+            raise ValueError("Search.run needs a time_budget_ms or a max_iterations budget")
 
-        #* selection: recursively select the best child nodes until a leaf node is found
-        while current.child:
-            child = current.child
-            max_score = max(c.get_ubc_score() for c in child.values()) # retrieve the child with scores that meet the ubc threshold
-            actions = [                                                # retrieve the action that led to the best children
-                a for a, c in child.items() if c.get_ubc_score() == max_score
-            ]
+        start = time.perf_counter()
+        if workers > 1:
+            from .parallel import run_root_parallel
+            results = run_root_parallel(self, workers, iterations=max_iterations, time_budget_ms=time_budget_ms,
+                                        convergence_tol=convergence_tol)
+            # converged when every worker did, otherwise the reason most workers stopped for
+            converged = all(result.converged for result in results)
+            reasons = Counter(result.stop_reason for result in results)
+            return SearchResult(
+                best_paths=self.get_best_paths(num_paths),
+                iterations=sum(result.iterations for result in results),
+                elapsed_ms=(time.perf_counter() - start) * 1000,
+                converged=converged,
+                stop_reason="converged" if converged else reasons.most_common(1)[0][0]
+            )
 
-            if len(actions) == 0:
-                print("No best node found")
+        deadline = start + time_budget_ms / 1000 if time_budget_ms is not None else None
+        iterations = 0
+        stable = 0
+        previous = None
+        stop_reason = "iterations"
+        while True:
+            if max_iterations is not None and iterations >= max_iterations:
+                stop_reason = "iterations"
+                break
+            if deadline is not None and time.perf_counter() >= deadline:
+                stop_reason = "time"
                 break
+            if self.tree.done[0]:
+                stop_reason = "terminal"
+                break
+
+            self.explore()
+            iterations += 1
+
+            # early stop once the best child keeps the same share of the root's visits
+            if convergence_tol is not None and iterations % check_every == 0:
+                share = self._best_visit_share()
+                if share and previous and share[0] == previous[0] and abs(share[1] - previous[1]) < convergence_tol:
+                    stable += 1
+                else:
+                    stable = 0
+                previous = share
+                if stable >= patience:
+                    stop_reason = "converged"
+                    break
+
+        return SearchResult(
+            best_paths=self.get_best_paths(num_paths),
+            iterations=iterations,
+            elapsed_ms=(time.perf_counter() - start) * 1000,
+            converged=stop_reason == "converged",
+            stop_reason=stop_reason
+        )
+
+    def get_best_paths(self, num_paths: int = 3) -> List[List[str]]:
+        """
+            Most visited action sequences: the top root children by visits, each followed down the
+            tree by always taking the most visited child
+            - num_paths: number of paths to return
+        """
+        tree = self.tree
+        children = tree.children(0)
+        visited = children[tree.visits[children] > 0]
+        ranked = visited[np.argsort(-tree.visits[visited], kind='stable')][:num_paths]
+
+        paths = []
+        for child in ranked:
+            current = int(child)
+            while True:
+                best = tree.most_visited_child(current)
+                if best < 0 or tree.visits[best] == 0:
+                    break
+                current = best
+            paths.append(tree.path_actions(current))
+        return paths
+
+    def promote(self, action: str):
+        """
+            Commit to an action: play it on the game and make the matching subtree the new root
+            so its statistics carry over to the next search
+        """
+        tree = self.tree
+        children = tree.children(0)
+        matches = children[[tree.actions[a] == action for a in tree.action[children]]] if len(children) else children
+
+        self.game.step(action)
+        if len(matches):
+            self.tree = tree.extract(int(matches[0]), capacity=self._capacity)
+        else:
+            self.tree = Tree(capacity=self._capacity, semantics=tree.semantics)
+        self.tree.done[0] = self.game.done
+
+    def save(self, path: str):
+        """
+            Checkpoint the search tree to a file (see serialize.py for the format)
+        """
+        save_tree(self.tree, path)
+
+    @classmethod
+    def load(cls, path: str, game, mmap_mode: Optional[str] = 'c', **kwargs) -> 'Search':
+        """
+            Resume a search from a checkpoint. The game must be at the state the tree was searched from
+            - mmap_mode: 'c' maps the tree copy-on-write (warm start without reading the whole file),
+                         'r' read-only for inspection, None reads it into memory
+            - kwargs: search settings (exploration constant, evaluator, ...)
+        """
+        search = cls(game, **kwargs)
+        search.tree = load_tree(path, mmap_mode=mmap_mode)
+        return search
+
+    def prune(self):
+        """
+            Bring the tree back under the memory budget: the least visited subtrees are collapsed into
+            their root node (its visits and value summarize the subtree) and the tree is compacted into
+            arrays sized to the budget, so a long search runs in fixed memory
+        """
+        if self._max_nodes is None:
+            return
+        self.tree.collapse(max(int(self._max_nodes * self.prune_fraction), 1))
+        self.tree = self.tree.extract(0, capacity=self._max_nodes)
+        self.prunes += 1
+
+    def reweight(self, game, decay: float = 0.5):
+        """
+            Keep the tree when the user's attributes change. Rewards are additive per action, so the
+            stored values are shifted by the reward change of each node's action plus the expected change
+            over the rest of a uniformly random game. Visits are scaled by decay to lower the confidence
+            in the shifted estimates
+            - game: environment with the new attributes (same possible actions)
+            - decay: fraction of the visits kept
+        """
+        tree = self.tree
+        n = tree.size
+        game.state.history = list(self.game.state.history) # carry over the actions already committed to
+        delta = game.reward_vector() - self.game.reward_vector()
+        mean_delta = float(delta.mean()) if len(delta) else 0.0
 
-            action = random.choice(actions) # select a random action from the best nodes if there are multiple
-            current = child[action]         # select the child node
+        # reward change per interned action id (actions the new game doesn't know keep their reward)
+        positions = {a: i for i, a in enumerate(game.possible_actions)}
+        action_delta = np.array([delta[positions[a]] if a in positions else 0.0 for a in tree.actions] + [0.0])
+        node_delta = action_delta[tree.action[:n]]  # the root's action id -1 picks the trailing 0
 
-        #* action: play a game or expand the node
-        if current.visits < 1:
-            current.wins = current.wins + self.rollout(current)     # Pass current node to rollout
+        # every visit of a node covers its own action plus the remaining steps of the game
+        remaining = game.horizon - len(game.state.history) - tree.depth[:n]
+        node_delta = node_delta + np.maximum(remaining, 0) * mean_delta
+
+        mean = np.divide(tree.value[:n], tree.visits[:n], out=np.zeros(n), where=tree.visits[:n] > 0)
+        visits = np.floor(tree.visits[:n] * decay).astype(tree.visits.dtype)
+        tree.visits[:n] = visits
+        tree.value[:n] = (mean + node_delta) * visits
+        tree.reward[:n] += action_delta[tree.action[:n]]
+
+        # the static ucb bonus depends on the attributes too
+        bonus = game.action_bonus()
+        action_bonus = np.array([bonus[positions[a]] if a in positions else 0.0 for a in tree.actions] + [0.0])
+        tree.bonus[:n] = action_bonus[tree.action[:n]]
+
+        self.game = game
+        self._order = None
+        self.evaluator.reset(game)
+        if self.transpositions is not None:
+            self.transpositions.clear()
+
+    def _best_visit_share(self) -> Optional[Tuple[int, float]]:
+        """
+            Most visited root child and its share of the root children's visits
+        """
+        visits = self.tree.visits[self.tree.children(0)]
+        total = visits.sum()
+        if total == 0:
+            return None
+        best = int(np.argmax(visits))
+        return best, float(visits[best] / total)
+
+    def explore_parallel(self, iterations: int, workers: Optional[int] = None, mode: str = "root"):
+        """
+            Run iterations of the search across several workers and merge the results into this tree
+            - iterations: total number of simulations
+            - workers: number of workers (defaults to the number of cores)
+            - mode: "root" runs independent searches in a process pool and merges their trees,
+                    "tree" shares this tree between threads using virtual loss
+        """
+        from .parallel import run_root_parallel, run_tree_parallel
+
+        workers = min(workers or os.cpu_count() or 1, iterations)
+        if workers <= 1:
+            for _ in range(iterations):
+                self.explore()
+        elif mode == "root":
+            run_root_parallel(self, workers, iterations=iterations)
+        elif mode == "tree":
+            run_tree_parallel(self, iterations, workers)
         else:
-            current.create_child()
-            if current.child:
-                current = random.choice(list(current.child.values()))
-            current.wins = current.wins + self.rollout(current)     # Pass node to rollout
-        
-        current.visits += 1
-        
-        #* backpropagation: backpropagate the results of the sim when a leaf node is reached
-        parent = current
-
-        while parent.parent:
-            parent = parent.parent
-            parent.visits += 1
-            parent.wins += current.wins  # update the parent node with results from sim at the leaf node
-
-    def rollout(self, node) -> float:
+            raise ValueError(f"Unknown parallel mode: {mode}")
+
+    def _select(self, game, path: List[int], rewards: List[float], rng: np.random.Generator):
+        """
+            Selection: recursively select the best child nodes until a leaf node is found
+        """
+        tree = self.tree
+        current = path[-1]
+        while tree.child_count[current]:
+            if self.widening_constant is not None:
+                self._widen(game, current)
+            current = tree.select_child(current, self.exploration_constant, rng, self.transpositions)
+            self._step(game, current, rewards)
+            path.append(current)
+
+    def _expand(self, game, path: List[int], rewards: List[float], rng: np.random.Generator):
+        """
+            Expansion: create the children of a visited leaf and move to a random one
+        """
+        tree = self.tree
+        current = path[-1]
+        if tree.visits[current] < 1 or tree.done[current]:
+            return
+
+        children = self._widen(game, current)
+        if len(children):
+            current = int(children[rng.integers(len(children))])
+            self._step(game, current, rewards)
+            path.append(current)
+
+    def _widen(self, game, index: int) -> np.ndarray:
+        """
+            Add the children a node is allowed to have. Without progressive widening that is every action;
+            with it the node gets ceil(c * visits^exponent) children, taken in order of the action priors,
+            so large action sets aren't expanded before the best-looking actions are explored
+            - returns: indices of the node's children
+        """
+        tree = self.tree
+        count = int(tree.child_count[index])
+        actions = game.get_actions()
+        allowed = len(actions)
+        if self.widening_constant is not None:
+            visits = max(int(tree.visits[index]), 1)
+            allowed = min(allowed, max(1, math.ceil(self.widening_constant * visits ** self.widening_exponent)))
+        if allowed <= count:
+            return tree.children(index)
+
+        order = self._action_order(game)[count:allowed]
+        children = tree.add_children(index, [actions[i] for i in order])
+        if hasattr(game, 'action_bonus'):
+            # static part of the ucb score, computed once per node
+            tree.bonus[children[count:]] = game.action_bonus()[order]
+        if self.transpositions is not None:
+            # shared statistics of unvisited children need the reward into them
+            tree.reward[children[count:]] = game.reward_vector()[order]
+        return children
+
+    def _action_order(self, game) -> np.ndarray:
+        """
+            Positions of the game's actions in the order children are added (highest prior first when widening)
+        """
+        if self._order is None:
+            if self.widening_constant is not None and hasattr(game, 'action_priors'):
+                self._order = np.argsort(-game.action_priors(), kind='stable')
+            else:
+                self._order = np.arange(len(game.get_actions()))
+        return self._order
+
+    def _evaluate(self, game, index: int, rng: np.random.Generator) -> float:
+        """
+            Simulation: value of the game at the leaf node
+        """
+        known = self._known_value(index)
+        if known is not None:
+            return known
+        return self.evaluator.evaluate(game, rng)
+
+    def _known_value(self, index: int) -> Optional[float]:
+        """
+            Value of a leaf that needs no evaluation (terminal or already in the transposition table), else None
+        """
+        if self.tree.done[index]:
+            return 0.0
+        if self.transpositions is not None:
+            return self.transpositions.lookup(self.tree, index)
+        return None
+
+    def _backpropagate(self, path: List[int], rewards: List[float], leaf_value: float):
+        """
+            Backpropagation: add the simulation results to the path (and to the transposition table)
+        """
+        returns = self.tree.backpropagate(path, rewards, leaf_value)
+        if self.transpositions is not None:
+            self.transpositions.update(self.tree, path, returns)
+
+    def _step(self, game, index: int, rewards: List[float]):
+        """
+            Play the action leading into a node on the game
+        """
+        _, reward, done = game.step(self.tree.actions[self.tree.action[index]])
+        self.tree.reward[index] = reward
+        rewards.append(reward)
+        if done:
+            self.tree.done[index] = True
+
+    def rollout(self, node: Node) -> float:
         """
             Simulate the game until the end for each node
             - node: node to run a simulator on
         """
         if node.done:
-            return 0  
-
-        # simulate the game
-        wins = 0
-        done = False
-        new_game = node.game.copy()
-
-        while not done:
-            action = new_game.get_action()
-            _, reward, done = new_game.step(action) 
-            wins += reward
-            if done:
-                new_game.reset()
-                new_game.close()
-                break
-        
-        return wins
-        
-
-        
+            return 0
+        return RandomRolloutEvaluator().evaluate(node.game, self.rng)
@@ -0,0 +1,118 @@
+# compact binary format for search trees (checkpoints, warm starts and offline analysis)
+from typing import Optional
+import numpy as np
+from .tree import Tree, _hash_action
+
+MAGIC = b"MCTSTREE"
+VERSION = 1
+
+# file layout:
+# - header (fixed size)
+# - action table: (actions + 1) int64 byte offsets followed by the utf-8 encoded actions, padded to 8 bytes
+# - node records: one fixed-width record per node row, in tree order
+HEADER = np.dtype([
+    ('magic', 'S8'),
+    ('version', '<u4'),
+    ('semantics', 'u1'),        # 0 multiset, 1 sequence
+    ('reserved', 'V3'),
+    ('nodes', '<u8'),
+    ('actions', '<u8'),
+    ('action_bytes', '<u8'),
+    ('records_offset', '<u8'),
+    ('garbage', '<u8'),
+    ('virtual_loss', '<f8'),
+])
+
+# virtual loss and transposition slots only mean something inside a running search, so they aren't stored
+RECORD = np.dtype([
+    ('parent', '<i4'),
+    ('action', '<i4'),
+    ('visits', '<i8'),
+    ('value', '<f8'),
+    ('child_start', '<i4'),
+    ('child_count', '<i4'),
+    ('child_capacity', '<i4'),
+    ('depth', '<i4'),
+    ('done', '?'),
+    ('bonus', '<f8'),
+    ('reward', '<f8'),
+    ('key', '<u8'),
+])
+
+_SEMANTICS = ("multiset", "sequence")
+
+def save_tree(tree: Tree, path: str):
+    """
+        Write a tree to a file
+        - tree: tree to save (rows are written as they are, including rows left behind by moved children)
+        - path: destination file
+    """
+    encoded = [action.encode('utf-8') for action in tree.actions]
+    offsets = np.zeros(len(encoded) + 1, dtype='<i8')
+    np.cumsum([len(a) for a in encoded], out=offsets[1:])
+    blob = b"".join(encoded)
+    padding = -(HEADER.itemsize + offsets.nbytes + len(blob)) % 8
+
+    header = np.zeros(1, dtype=HEADER)
+    header['magic'] = MAGIC
+    header['version'] = VERSION
+    header['semantics'] = _SEMANTICS.index(tree.semantics)
+    header['nodes'] = tree.size
+    header['actions'] = len(encoded)
+    header['action_bytes'] = len(blob)
+    header['records_offset'] = HEADER.itemsize + offsets.nbytes + len(blob) + padding
+    header['garbage'] = tree.garbage
+    header['virtual_loss'] = tree.virtual_loss
+
+    records = np.empty(tree.size, dtype=RECORD)
+    for name in RECORD.names:
+        records[name] = getattr(tree, name)[:tree.size]
+
+    with open(path, 'wb') as f:
+        f.write(header.tobytes())
+        f.write(offsets.tobytes())
+        f.write(blob)
+        f.write(b"\0" * padding)
+        f.write(records.tobytes())
+
+def load_tree(path: str, mmap_mode: Optional[str] = None) -> Tree:
+    """
+        Read a tree from a file
+        - path: file written by save_tree
+        - mmap_mode: None reads the whole tree into memory. 'r' maps the node records read-only
+                     (inspect large trees without loading them), 'c' maps them copy-on-write so a search
+                     can be warm-started from the file (changes stay in memory, the file is untouched)
+    """
+    with open(path, 'rb') as f:
+        header = np.frombuffer(f.read(HEADER.itemsize), dtype=HEADER)[0]
+        if header['magic'] != MAGIC:
+            raise ValueError(f"{path} is not a search tree file")
+        if header['version'] != VERSION:
+            raise ValueError(f"Unsupported search tree file version: {header['version']}")
+        offsets = np.frombuffer(f.read(8 * (int(header['actions']) + 1)), dtype='<i8')
+        blob = f.read(int(header['action_bytes']))
+
+    nodes = int(header['nodes'])
+    offset = int(header['records_offset'])
+    if mmap_mode is None:
+        records = np.fromfile(path, dtype=RECORD, count=nodes, offset=offset)
+    else:
+        records = np.memmap(path, dtype=RECORD, mode=mmap_mode, offset=offset, shape=(nodes,))
+
+    tree = Tree(capacity=1, semantics=_SEMANTICS[int(header['semantics'])])
+    tree.actions = [blob[offsets[i]:offsets[i + 1]].decode('utf-8') for i in range(len(offsets) - 1)]
+    tree._action_ids = {action: i for i, action in enumerate(tree.actions)}
+    tree._action_hashes = [_hash_action(action) for action in tree.actions]
+    tree.garbage = int(header['garbage'])
+    tree.virtual_loss = float(header['virtual_loss'])
+
+    # mapped trees use the record fields as their columns (strided views into the file); the arrays
+    # are only copied out when the tree grows
+    for name in RECORD.names:
+        column = records[name]
+        setattr(tree, name, column if mmap_mode is not None else np.ascontiguousarray(column, dtype=column.dtype.newbyteorder('=')))
+    tree.virtual = np.zeros(nodes, dtype=np.int32)
+    tree.slot = np.full(nodes, -1, dtype=np.int32)
+    tree.size = nodes
+    tree.capacity = nodes
+    return tree
@@ -0,0 +1,90 @@
+# cache of search trees kept between planning requests about the same decision
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional
+from .search import Search
+from .simulator import Environment
+
+SessionKey = str
+
+class SearchSessionCache:
+    """
+        Keeps the search tree of each decision so follow-up requests warm-start from the existing visits
+        Functions:
+        - actions: action set searched for a decision, so follow-ups reuse it instead of generating new actions
+        - get: search for a decision, created on first use and re-weighted when the attributes change
+        - commit: promote the subtree of the action the user committed to as the new root
+        sessions are evicted least recently used first when there are too many or the trees use too much memory
+    """
+    def __init__(self, max_sessions: int = 32, max_bytes: int = 512 * 1024 * 1024, reweight_decay: float = 0.5):
+        self.max_sessions = max_sessions        # number of decisions kept
+        self.max_bytes = max_bytes              # memory cap across all trees
+        self.reweight_decay = reweight_decay    # fraction of visits kept when the attributes change
+        self._sessions: "OrderedDict[SessionKey, Search]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    @staticmethod
+    def session_key(state) -> SessionKey:
+        """
+            Sessions are keyed by the decision being made
+        """
+        return state.description
+
+    def actions(self, state) -> Optional[List[str]]:
+        """
+            Actions the decision's tree was searched with (None for a new decision). Generated actions
+            differ from one request to the next, so a follow-up has to reuse these to warm-start
+        """
+        search = self._sessions.get(self.session_key(state))
+        return list(search.game.possible_actions) if search is not None else None
+
+    def get(self, state, constraints: Optional[Dict] = None,
+            factory: Optional[Callable[[Environment], Search]] = None) -> Search:
+        """
+            Return the search for a decision, creating it if needed
+            - state: state of the decision (its action_metadata holds the actions considered)
+            - constraints: constraints of the game
+            - factory: builds a new search from the environment (defaults to Search(env))
+        """
+        game = Environment(state, constraints=constraints or {})
+        key = self.session_key(state)
+
+        search = self._sessions.get(key)
+        if search is not None and set(game.possible_actions) != set(search.game.possible_actions):
+            search = None # the tree's children are the old actions, start over
+        if search is None:
+            search = factory(game) if factory else Search(game)
+            self._sessions[key] = search
+        else:
+            self._sessions.move_to_end(key)
+            if game.impact_factors != search.game.impact_factors:
+                search.reweight(game, decay=self.reweight_decay)
+
+        self._evict()
+        return search
+
+    def commit(self, state, action: str) -> Optional[Search]:
+        """
+            The user committed to an action: its subtree becomes the root of the decision's search
+        """
+        key = self.session_key(state)
+        search = self._sessions.get(key)
+        if search is None:
+            return None
+        search.promote(action)
+        self._sessions.move_to_end(key)
+        return search
+
+    def nbytes(self) -> int:
+        """
+            Memory held by the trees of all sessions
+        """
+        return sum(search.tree.nbytes for search in self._sessions.values())
+
+    def _evict(self):
+        """
+            Drop the least recently used sessions until the limits hold (the most recent one is always kept)
+        """
+        while len(self._sessions) > 1 and (len(self._sessions) > self.max_sessions or self.nbytes() > self.max_bytes):
+            self._sessions.popitem(last=False)
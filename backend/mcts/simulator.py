@@ -4,6 +4,15 @@ from dataclasses import dataclass
 from typing import List, Dict, Any, Tuple
 import copy
 import random
+import numpy as np
+
+def _normalize(vector) -> np.ndarray:
+    """
+        Unit-length float32 copy of a vector (zeros stay zeros)
+    """
+    vector = np.asarray(vector, dtype=np.float32).ravel()
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm > 0 else vector
 
 @dataclass
 class Environment:
@@ -22,11 +31,27 @@ class Environment:
     possible_actions: List[str]    # contains the possible actions the user can take
     constraints: Dict[str, Any] # contains user-defined constraints of the game
     impact_factors: Dict[str, Any] # contains user-defined impact factors
+    horizon: int # number of actions played before the game ends
+    goal_embedding: np.ndarray # normalized embedding of the user's goal
+    user_preferences: Dict[str, float] # weights of the state attributes in the ucb score
+
+    # rewards depend only on which actions were taken and the game ends after a fixed number of steps,
+    # so states with the same actions in a different order are the same state
+    history_semantics = "multiset"
+    additive_rewards = True # the return of a game is the sum of per-action rewards
 
     def __init__(self, initial_state: Dict[str, Any], constraints: Dict[str, Any]):
         self.state = initial_state
         self.constraints = constraints
         self.possible_actions = list(initial_state.action_metadata.keys()) if hasattr(initial_state, "action_metadata") else []
+        self.horizon = len(self.possible_actions)
+        embedding = getattr(initial_state, 'embedding', None)
+        self.goal_embedding = _normalize(embedding if embedding is not None else []) # unit float32 vector
+        self.user_preferences: Dict[str, float] = {} # weight of each state attribute in the ucb score
+        self.embedding_weight = 0.5 # importance of user context in the ucb score
+        self._action_matrix = None # cached action embeddings (see action_matrix)
+        self._priors = None # cached action priors
+        self._bonus = None # cached static ucb bonus per action
 
         # initialize impact factors
         state_attributes = initial_state.attributes
@@ -38,25 +63,31 @@ class Environment:
 
     def step(self, action: str) -> Tuple[Dict[str, Any], float, bool]:
         """ 
-            Execute action and return a new state, reward, and done flag
+            Execute action in place and return the state, reward, and done flag
             - action: action to be executed
-            - returns: (new_state, reward, is_terminal)
+            - returns: (state, reward, is_terminal)
+            the action is pushed onto the state's history, call undo to take it back
         """
-        # Deep copy the current state
-        new_state = copy.deepcopy(self.state)
-        
         # Calculate reward for this action
         reward = self._calculate_reward(action)
 
         # Update action history in state
-        if not hasattr(new_state, 'history'):
-            new_state.history = []
-        new_state.history.append(action)
+        if not hasattr(self.state, 'history'):
+            self.state.history = []
+        self.state.history.append(action)
 
         # check if game is over
         is_terminal = self._is_terminal()
 
-        return new_state, reward, is_terminal
+        return self.state, reward, is_terminal
+
+    def undo(self, steps: int = 1):
+        """
+            Take back the last actions played with step
+            - steps: number of actions to take back
+        """
+        if steps > 0:
+            del self.state.history[-steps:]
     
     def _calculate_reward(self, action: str) -> float:
         """
@@ -84,20 +115,93 @@ class Environment:
         
         return reward
     
+    def reward_vector(self) -> np.ndarray:
+        """
+            Reward of every possible action (same order as possible_actions) computed in one pass.
+            Mirrors _calculate_reward so batched simulations can look rewards up by action index
+        """
+        metadata = self.state.action_metadata
+        high_risk = np.array([metadata.get(a, {}).get('is_high_risk', False) for a in self.possible_actions], dtype=bool)
+        long_term = np.array([metadata.get(a, {}).get('is_long_term', False) for a in self.possible_actions], dtype=bool)
+
+        rewards = np.full(len(self.possible_actions), self.impact_factors['importance'], dtype=np.float64)
+        rewards -= high_risk * (1 - self.impact_factors['risk'])
+        rewards -= long_term * self.impact_factors['time-constraint']
+        return rewards
+
+    def action_matrix(self) -> np.ndarray:
+        """
+            Normalized float32 embedding of every possible action, one row per action (zeros for
+            actions without an embedding). Built once and shared by copies of the environment
+        """
+        if self._action_matrix is None:
+            embeddings = getattr(self.state, 'action_embeddings', None) or {}
+            matrix = np.zeros((len(self.possible_actions), self.goal_embedding.size), dtype=np.float32)
+            for i, action in enumerate(self.possible_actions):
+                vector = embeddings.get(action)
+                if vector is not None and len(vector) == self.goal_embedding.size:
+                    matrix[i] = _normalize(vector)
+            self._action_matrix = matrix
+        return self._action_matrix
+
+    def action_priors(self) -> np.ndarray:
+        """
+            Cheap prior per possible action (same order as possible_actions): cosine similarity between
+            the action's embedding and the goal embedding, as one matrix-vector product. Actions without
+            an embedding get 0
+        """
+        if self._priors is None:
+            self._priors = self.action_matrix() @ self.goal_embedding
+        return self._priors
+
+    def action_bonus(self) -> np.ndarray:
+        """
+            Static part of the ucb score of every possible action: the embedding bonus (similarity to the goal)
+            plus the preference bonus (user preferences weighting the state's attributes).
+            Stored on the tree nodes when they are created so selection only does the visit/value arithmetic
+        """
+        if self._bonus is None:
+            attributes = self.state.attributes
+            preference_bonus = sum(attributes[attr] * weight for attr, weight in self.user_preferences.items() if attr in attributes)
+            self._bonus = self.action_priors().astype(np.float64) * self.embedding_weight + preference_bonus
+        return self._bonus
+
+    def remaining_steps(self) -> int:
+        """
+            Number of actions left before the game ends
+        """
+        return max(self.horizon - len(self.state.history), 0)
+
     def _is_terminal(self) -> bool:
         """
             Check if game reached terminal state (leaf node)
         """
-        return len(self.state.history) >= len(self.possible_actions)
+        return len(self.state.history) >= self.horizon
     
-    def get_action(self) -> str:
+    @property
+    def done(self) -> bool:
+        return self._is_terminal()
+
+    def get_actions(self) -> List[str]:
+        """
+            Return all actions that can be taken from the current state
+        """
+        return list(self.possible_actions)
+
+    def get_action(self, rng=None) -> str:
         """
             Return a random action from the possible actions
+            - rng: optional numpy generator (parallel searches give each worker its own stream)
         """
-        return random.choice(self.possible_actions)
+        if rng is None:
+            return random.choice(self.possible_actions)
+        return self.possible_actions[rng.integers(len(self.possible_actions))]
     
     def copy(self) -> 'Environment':
         """
-            Return a deep copy of the environment
+            Return a copy of the environment with its own action history. The state's embedding,
+            the constraints and the action metadata are shared with the original
         """
-        return copy.deepcopy(self)
+        game = copy.copy(self)
+        game.state = self.state.copy()
+        return game
@@ -17,11 +17,14 @@ class State:
     description: str
     action_metadata: Dict[str, Dict[str, bool]] # classifies each action
     history: List[str]                          # contains the history of actions taken
+    action_embeddings: Dict[str, List[float]]   # optional embedding of each action (prior for expansion order)
 
-    def __init__(self, description: str, attributes: Dict[str, float], embedding: List[float], actions: List[str] = None):
+    def __init__(self, description: str, attributes: Dict[str, float], embedding: List[float], actions: List[str] = None,
+                 action_embeddings: Dict[str, List[float]] = None):
         self.description = description
         self.embedding = embedding
         self.history = [] # initialize empty action history
+        self.action_embeddings = action_embeddings or {}
 
         # allocate weights for attributes
         default_attributes = {
@@ -37,7 +40,7 @@ class State:
         # initialize action metadata
         self.action_metadata = {}
         if actions:
-            self.classify_actions(actions)
+            self._classify_actions(actions)
     
     def _classify_actions(self, actions: List[str]):
         """ 
@@ -63,6 +66,9 @@ class State:
 
     def copy(self) -> 'State':
         """
-            Return a deep copy of the state
+            Return a lightweight copy of the state. The embedding, attributes and action metadata
+            are shared with the original, only the action history is copied
         """
-        return copy.deepcopy(self)
\ No newline at end of file
+        state = copy.copy(self)
+        state.history = list(self.history)
+        return state
\ No newline at end of file
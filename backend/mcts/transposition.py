@@ -0,0 +1,142 @@
+# transposition table sharing statistics between tree nodes that reach the same game state
+from typing import Dict, List, Optional
+import numpy as np
+
+class TranspositionTable:
+    """
+        Visit and value statistics per game state, keyed by the state hash stored in the tree (Tree.key).
+        Values are returns-to-go from the state (the reward of the action leading into it is left out),
+        so every path reaching the state can reuse them. Entries live in fixed-size arrays and the least
+        recently used ones are evicted when the table is full
+        Functions:
+        - shared_stats: statistics of a range of sibling nodes, read from the table where available
+        - lookup: mean return-to-go of a node's state (skips the rollout of a known state)
+        - update: add the returns of a simulation to the states on its path
+    """
+    def __init__(self, max_entries: int = 100_000, evict_fraction: float = 0.1):
+        self.max_entries = max_entries
+        self.evict_count = max(int(max_entries * evict_fraction), 1) # entries freed at once when full
+        self.keys = np.zeros(max_entries, dtype=np.uint64)
+        self.visits = np.zeros(max_entries, dtype=np.int64)
+        self.value = np.zeros(max_entries, dtype=np.float64)
+        self.last_used = np.zeros(max_entries, dtype=np.int64)
+        self._slots: Dict[int, int] = {}    # state key -> slot
+        self._free: List[int] = []          # slots freed by eviction
+        self._next = 0                      # first slot never used
+        self._clock = 0                     # update counter for least-recently-used eviction
+        self.hits = 0                       # rollouts skipped because the state was already known
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._slots)
+
+    def clear(self):
+        """
+            Drop every entry (the statistics are stale once the rewards change)
+        """
+        self.keys[:] = 0
+        self.visits[:] = 0
+        self.value[:] = 0.0
+        self.last_used[:] = 0
+        self._slots.clear()
+        self._free.clear()
+        self._next = 0
+
+    def _valid(self, tree, nodes: np.ndarray) -> np.ndarray:
+        """
+            Whether the slots stored on the nodes still belong to their states (slots are reused after eviction)
+        """
+        slots = tree.slot[nodes]
+        safe = np.maximum(slots, 0)
+        return (slots >= 0) & (self.keys[safe] == tree.key[nodes]) & (self.visits[safe] > 0)
+
+    def _resolve(self, tree, nodes: np.ndarray):
+        """
+            Point the nodes at the table entries of their states (-1 if the state isn't in the table)
+        """
+        for node in nodes:
+            tree.slot[node] = self._slots.get(int(tree.key[node]), -1)
+
+    def shared_stats(self, tree, start: int, end: int):
+        """
+            Visits and values of the nodes start..end, taken from the table for states it knows.
+            The table holds returns-to-go, so the reward into each node is added back per visit
+        """
+        nodes = np.arange(start, end)
+        valid = self._valid(tree, nodes)
+        if not valid.all():
+            self._resolve(tree, nodes[~valid])
+            valid = self._valid(tree, nodes)
+
+        slots = np.maximum(tree.slot[start:end], 0)
+        shared_visits = self.visits[slots]
+        visits = np.where(valid, shared_visits, tree.visits[start:end])
+        value = np.where(valid, self.value[slots] + tree.reward[start:end] * shared_visits, tree.value[start:end])
+        return visits, value
+
+    def lookup(self, tree, index: int) -> Optional[float]:
+        """
+            Mean return-to-go of the state at a node, or None if the state isn't in the table
+        """
+        slot = self._slots.get(int(tree.key[index]))
+        if slot is None:
+            return None
+        tree.slot[index] = slot
+        self.hits += 1
+        return float(self.value[slot] / self.visits[slot])
+
+    def update(self, tree, path: List[int], returns: np.ndarray):
+        """
+            Add the returns of a simulation to the states on its path
+            - path: node indices from the root to the leaf
+            - returns: return credited to each node (including the reward into the node)
+        """
+        self._clock += 1
+        path = np.asarray(path)
+
+        # touch the entries already on the path first so eviction can't drop them
+        valid = self._valid(tree, path)
+        self.last_used[tree.slot[path[valid]]] = self._clock
+        for node in path[~valid]:
+            tree.slot[node] = self._insert(int(tree.key[node]))
+
+        slots = tree.slot[path]
+        self.visits[slots] += 1
+        self.value[slots] += returns - tree.reward[path]
+        self.last_used[slots] = self._clock
+
+    def _insert(self, key: int) -> int:
+        """
+            Return the slot of a state, creating an empty entry if it isn't in the table
+        """
+        slot = self._slots.get(key)
+        if slot is not None:
+            return slot
+
+        if not self._free and self._next == self.max_entries:
+            self._evict()
+        if self._free:
+            slot = self._free.pop()
+        else:
+            slot = self._next
+            self._next += 1
+
+        self._slots[key] = slot
+        self.keys[slot] = key
+        self.visits[slot] = 0
+        self.value[slot] = 0.0
+        self.last_used[slot] = self._clock
+        return slot
+
+    def _evict(self):
+        """
+            Free the least recently used entries
+        """
+        victims = np.argpartition(self.last_used, self.evict_count - 1)[:self.evict_count]
+        for slot in victims:
+            del self._slots[int(self.keys[slot])]
+            self.keys[slot] = 0
+            self.visits[slot] = 0
+            self.value[slot] = 0.0
+            self._free.append(int(slot))
+        self.evictions += len(victims)
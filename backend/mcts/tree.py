@@ -0,0 +1,425 @@
+# array-backed storage for the search tree (struct of arrays)
+from typing import List, Dict
+import hashlib
+import math
+import numpy as np
+
+_SEQUENCE_PRIME = np.uint64(1099511628211) # mixes the order of actions into sequence keys
+
+def _hash_action(action: str) -> int:
+    """
+        Stable 64-bit hash of an action (same value in every process, unlike hash())
+    """
+    return int.from_bytes(hashlib.blake2b(action.encode('utf-8'), digest_size=8).digest(), 'little')
+
+class Tree:
+    """
+        Search tree stored as a set of growable numpy arrays. A node is a row index into the arrays,
+        so selection and backpropagation run as vectorized operations instead of python loops
+        Arrays:
+        - parent: index of the parent node (-1 for the root)
+        - action: id of the action that led to the node (index into the interned action table)
+        - visits: number of times the node has been visited
+        - value: sum of the returns backpropagated through the node
+        - child_start, child_count: the children of a node are stored in one contiguous range
+        - child_capacity: rows reserved for the node's children (room to add children without moving them)
+        - depth: number of actions taken from the root
+        - done: whether the node is terminal
+        - bonus: static score added to the ucb score of the node
+        - virtual: number of in-flight simulations through the node (tree-parallel search)
+        - reward: reward of the action leading into the node
+        - key: hash of the game state at the node (history as a multiset or a sequence)
+        - slot: entry of the node's state in a transposition table (-1 if none)
+    """
+    def __init__(self, capacity: int = 1024, semantics: str = "multiset"):
+        self.size = 0                               # number of nodes in use
+        self.capacity = 0                           # number of allocated rows
+        self.semantics = semantics                  # whether the order of the history matters for the state key
+        self.actions: List[str] = []                # interned action table (action id -> action)
+        self._action_ids: Dict[str, int] = {}       # action -> action id
+        self._action_hashes: List[int] = []         # action id -> stable action hash
+        self.garbage = 0                            # rows left behind when a set of children was moved
+
+        self.parent = np.empty(0, dtype=np.int32)
+        self.action = np.empty(0, dtype=np.int32)
+        self.visits = np.empty(0, dtype=np.int64)
+        self.value = np.empty(0, dtype=np.float64)
+        self.child_start = np.empty(0, dtype=np.int32)
+        self.child_count = np.empty(0, dtype=np.int32)
+        self.child_capacity = np.empty(0, dtype=np.int32)
+        self.depth = np.empty(0, dtype=np.int32)
+        self.done = np.empty(0, dtype=bool)
+        self.bonus = np.empty(0, dtype=np.float64)
+        self.virtual = np.empty(0, dtype=np.int32)
+        self.virtual_loss = 1.0                     # value subtracted per in-flight simulation
+        self.reward = np.empty(0, dtype=np.float64)
+        self.key = np.empty(0, dtype=np.uint64)
+        self.slot = np.empty(0, dtype=np.int32)
+
+        self._grow(max(capacity, 1))
+        self._allocate(1, parent=-1, depth=0)      # root node is always index 0
+
+    _columns = ('parent', 'action', 'visits', 'value', 'child_start', 'child_count', 'child_capacity', 'depth',
+                'done', 'bonus', 'virtual', 'reward', 'key', 'slot')
+
+    def _grow(self, min_capacity: int):
+        """
+            Reallocate every array with at least min_capacity rows (amortized doubling)
+        """
+        capacity = max(min_capacity, self.capacity * 2)
+        for name in self._columns:
+            old = getattr(self, name)
+            new = np.zeros(capacity, dtype=old.dtype)
+            new[:self.size] = old[:self.size]
+            setattr(self, name, new)
+        self.capacity = capacity
+
+    @property
+    def row_bytes(self) -> int:
+        """
+            Memory used by one node across all the arrays
+        """
+        return sum(getattr(self, name).itemsize for name in self._columns)
+
+    @property
+    def nbytes(self) -> int:
+        """
+            Memory held by the node arrays (allocated rows, not just the ones in use)
+        """
+        return sum(getattr(self, name).nbytes for name in self._columns)
+
+    def _allocate(self, count: int, parent: int, depth: int) -> int:
+        """
+            Reserve count contiguous rows and return the index of the first one
+        """
+        start = self.size
+        if start + count > self.capacity:
+            self._grow(start + count)
+        end = start + count
+        self.parent[start:end] = parent
+        self.action[start:end] = -1
+        self.visits[start:end] = 0
+        self.value[start:end] = 0.0
+        self.child_start[start:end] = 0
+        self.child_count[start:end] = 0
+        self.child_capacity[start:end] = 0
+        self.depth[start:end] = depth
+        self.done[start:end] = False
+        self.bonus[start:end] = 0.0
+        self.virtual[start:end] = 0
+        self.reward[start:end] = 0.0
+        self.key[start:end] = 0
+        self.slot[start:end] = -1
+        self.size = end
+        return start
+
+    def intern(self, action: str) -> int:
+        """
+            Return the id of an action, adding it to the action table if it is new
+        """
+        action_id = self._action_ids.get(action)
+        if action_id is None:
+            action_id = len(self.actions)
+            self._action_ids[action] = action_id
+            self.actions.append(action)
+            self._action_hashes.append(_hash_action(action))
+        return action_id
+
+    def expand(self, index: int, actions: List[str]) -> np.ndarray:
+        """
+            Create one child per action for the node and return the indices of the children
+            - index: node to expand
+            - actions: actions available from the node
+        """
+        if self.child_count[index] or not actions:
+            return self.children(index)
+        return self.add_children(index, actions)
+
+    def add_children(self, index: int, actions: List[str]) -> np.ndarray:
+        """
+            Append children to a node (progressive widening adds them a few at a time).
+            When the node's reserved rows are full its children move to a new range at the end of the
+            arrays with double the room, so a node that keeps widening is moved O(log n) times
+            - returns: indices of all the node's children
+        """
+        count = int(self.child_count[index])
+        if not actions:
+            return self.children(index)
+
+        total = count + len(actions)
+        depth = int(self.depth[index]) + 1
+        if count == 0:
+            start = self._allocate(total, parent=index, depth=depth)
+            self.child_capacity[index] = total
+        elif total > self.child_capacity[index]:
+            old = int(self.child_start[index])
+            capacity = max(total, 2 * int(self.child_capacity[index]))
+            start = self._allocate(capacity, parent=index, depth=depth)
+            for name in self._columns:
+                if name != 'parent':
+                    column = getattr(self, name)
+                    column[start:start + count] = column[old:old + count]
+
+            # the grandchildren point at the moved children
+            for child in range(start, start + count):
+                if self.child_count[child]:
+                    first = int(self.child_start[child])
+                    self.parent[first:first + int(self.child_capacity[child])] = child
+
+            self.garbage += int(self.child_capacity[index])
+            self.child_capacity[index] = capacity
+        else:
+            start = int(self.child_start[index])
+
+        action_ids = [self.intern(a) for a in actions]
+        self.action[start + count:start + total] = action_ids
+
+        # the child's state key extends the parent's key with the action taken
+        hashes = np.array([self._action_hashes[a] for a in action_ids], dtype=np.uint64)
+        keys = np.full(len(actions), self.key[index], dtype=np.uint64)
+        if self.semantics == "sequence":
+            keys *= _SEQUENCE_PRIME
+        self.key[start + count:start + total] = keys + hashes
+
+        self.child_start[index] = start
+        self.child_count[index] = total
+        return self.children(index)
+
+    def children(self, index: int) -> np.ndarray:
+        """
+            Indices of the children of a node
+        """
+        start = int(self.child_start[index])
+        return np.arange(start, start + int(self.child_count[index]))
+
+    def child_stats(self, index: int, table=None):
+        """
+            Visits and values of the children of a node, including in-flight simulations.
+            With a transposition table, children whose state is in the table use the shared statistics
+        """
+        start = int(self.child_start[index])
+        end = start + int(self.child_count[index])
+        if table is None:
+            visits, value = self.visits[start:end], self.value[start:end]
+        else:
+            visits, value = table.shared_stats(self, start, end)
+
+        virtual = self.virtual[start:end]
+        return visits + virtual, value - virtual * self.virtual_loss
+
+    def ucb_scores(self, index: int, exploration_constant: float = 1.41, table=None, stats=None) -> np.ndarray:
+        """
+            Calculate the UCB score of all children of a node in one vectorized operation
+            - unvisited children score inf (favor exploration)
+            - in-flight simulations count as visits that lost (virtual loss)
+            - stats: (visits, value) from child_stats if the caller already has them
+        """
+        start = int(self.child_start[index])
+        end = start + int(self.child_count[index])
+        visits, value = stats if stats is not None else self.child_stats(index, table)
+        visits = visits.astype(np.float64)
+        log_parent = math.log(max(int(self.visits[index] + self.virtual[index]), 1))
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            exploitation = value / visits
+            exploration = exploration_constant * np.sqrt(log_parent / visits)
+            scores = exploitation + exploration + self.bonus[start:end]
+        scores[visits == 0] = np.inf
+        return scores
+
+    def select_child(self, index: int, exploration_constant: float, rng: np.random.Generator, table=None) -> int:
+        """
+            Return the child with the highest UCB score, breaking ties at random
+        """
+        start = int(self.child_start[index])
+
+        # unvisited children all score inf, so pick one of them without scoring the rest
+        stats = self.child_stats(index, table)
+        unvisited = np.flatnonzero(stats[0] == 0)
+        if len(unvisited):
+            return start + int(unvisited[rng.integers(len(unvisited))])
+
+        scores = self.ucb_scores(index, exploration_constant, stats=stats)
+        best = np.flatnonzero(scores == scores.max())
+        if len(best) == 1:
+            return start + int(best[0])
+        return start + int(best[rng.integers(len(best))])
+
+    def backpropagate(self, path: List[int], rewards: List[float], leaf_value: float) -> np.ndarray:
+        """
+            Add the results of a simulation to every node on the path
+            - path: node indices from the root to the leaf
+            - rewards: reward of the action leading into each node after the root
+            - leaf_value: value of the simulation played from the leaf
+            each node receives the return collected from its own action to the end of the game
+            - returns: the return credited to each node on the path
+        """
+        returns = np.full(len(path), leaf_value, dtype=np.float64)
+        if rewards:
+            tail = np.cumsum(rewards[::-1])[::-1]
+            returns[1:] += tail
+            returns[0] += tail[0]
+
+        path = np.asarray(path)
+        self.visits[path] += 1
+        self.value[path] += returns
+        return returns
+
+    def most_visited_child(self, index: int) -> int:
+        """
+            Index of the most visited child of a node (-1 if the node has no children)
+        """
+        count = int(self.child_count[index])
+        if count == 0:
+            return -1
+        start = int(self.child_start[index])
+        return start + int(np.argmax(self.visits[start:start + count]))
+
+    def path_actions(self, index: int) -> List[str]:
+        """
+            Actions taken from the root to reach a node
+        """
+        actions = []
+        while index > 0:
+            actions.append(self.actions[self.action[index]])
+            index = int(self.parent[index])
+        return actions[::-1]
+
+    def locate(self, action_ids: List[int]) -> List[int]:
+        """
+            Node indices along a path given by its action ids (a path held across add_children may have moved)
+        """
+        path = [0]
+        for action in action_ids:
+            children = self.children(path[-1])
+            path.append(int(children[np.flatnonzero(self.action[children] == action)[0]]))
+        return path
+
+    def merge(self, other: 'Tree'):
+        """
+            Add the statistics of another tree searched from the same root into this tree.
+            Nodes are matched by the actions leading to them; subtrees missing here are copied over
+        """
+        stack = [(0, 0)]
+        while stack:
+            i, j = stack.pop()
+            self.visits[i] += other.visits[j]
+            self.value[i] += other.value[j]
+            self.done[i] |= other.done[j]
+            if not other.child_count[j]:
+                continue
+
+            theirs = other.children(j)
+            mine = {int(self.action[c]): int(c) for c in self.children(i)}
+            missing = [other.actions[a] for a in other.action[theirs] if self.intern(other.actions[a]) not in mine]
+            if missing:
+                self.add_children(i, missing)
+                mine = {int(self.action[c]): int(c) for c in self.children(i)}
+            for c in theirs:
+                k = mine.get(self.intern(other.actions[other.action[c]]))
+                if k is not None:
+                    self.bonus[k] = other.bonus[c]
+                    self.reward[k] = other.reward[c]
+                    stack.append((k, int(c)))
+
+    def subtract(self, other: 'Tree'):
+        """
+            Remove the statistics of the tree this one was copied from, leaving only what was added since
+            (a warm-started worker's contribution). Nodes are matched by the actions leading to them;
+            nodes of the other tree missing here (collapsed since) are skipped, their parent's visits
+            already cover them
+        """
+        stack = [(0, 0)]
+        while stack:
+            i, j = stack.pop()
+            self.visits[i] -= other.visits[j]
+            self.value[i] -= other.value[j]
+            if not other.child_count[j] or not self.child_count[i]:
+                continue
+            mine = {int(self.action[c]): int(c) for c in self.children(i)}
+            for c in other.children(j):
+                k = mine.get(self._action_ids.get(other.actions[other.action[c]], -1))
+                if k is not None:
+                    stack.append((k, int(c)))
+
+    def collapse(self, max_nodes: int) -> int:
+        """
+            Collapse the least visited subtrees until at most max_nodes nodes are reachable from the root.
+            A collapsed node keeps its own visits and value as a summary of its subtree and becomes a leaf
+            again (the search re-expands it if it gets selected). The rows of the dropped nodes stay
+            allocated until the tree is compacted with extract(0)
+            - returns: number of nodes dropped
+        """
+        # reachable nodes in breadth-first order
+        order = [0]
+        for node in order:
+            count = int(self.child_count[node])
+            if count:
+                start = int(self.child_start[node])
+                order.extend(range(start, start + count))
+        if len(order) <= max_nodes:
+            return 0
+
+        # number of descendants of every node
+        order = np.asarray(order)
+        descendants = np.zeros(self.size, dtype=np.int64)
+        for node in order[:0:-1]:
+            descendants[self.parent[node]] += descendants[node] + 1
+
+        internal = order[1:][self.child_count[order[1:]] > 0]
+        candidates = internal[np.argsort(self.visits[internal], kind='stable')]
+        collapsed = np.zeros(self.size, dtype=bool)
+        dropped = 0
+        for node in candidates:
+            if len(order) - dropped <= max_nodes:
+                break
+            ancestors = []
+            parent = int(self.parent[node])
+            while parent > 0 and not collapsed[parent]:
+                ancestors.append(parent)
+                parent = int(self.parent[parent])
+            if parent > 0:
+                continue # inside a subtree that was already dropped
+
+            removed = int(descendants[node])
+            descendants[ancestors] -= removed
+            descendants[node] = 0
+            collapsed[node] = True
+            self.child_count[node] = 0
+            self.child_capacity[node] = 0
+            dropped += removed
+        return dropped
+
+    def extract(self, index: int, capacity: int = 1024) -> 'Tree':
+        """
+            Copy the subtree rooted at a node into a new compact tree where that node is the root.
+            The action table is copied so action ids and state keys stay valid
+            - capacity: rows allocated up front in the new tree
+        """
+        tree = Tree(capacity=capacity, semantics=self.semantics)
+        tree.actions = list(self.actions)
+        tree._action_ids = dict(self._action_ids)
+        tree._action_hashes = list(self._action_hashes)
+        tree.virtual_loss = self.virtual_loss
+
+        copied = [name for name in self._columns if name not in ('parent', 'child_start', 'child_count', 'child_capacity', 'depth', 'virtual')]
+        for name in copied:
+            getattr(tree, name)[0] = getattr(self, name)[index]
+
+        # depth-first copy, the children of a node are allocated in one block so siblings stay contiguous
+        base_depth = int(self.depth[index])
+        stack = [(index, 0)]
+        while stack:
+            old, new = stack.pop()
+            count = int(self.child_count[old])
+            if not count:
+                continue
+            start = int(self.child_start[old])
+            new_start = tree._allocate(count, parent=new, depth=int(self.depth[start]) - base_depth)
+            for name in copied:
+                getattr(tree, name)[new_start:new_start + count] = getattr(self, name)[start:start + count]
+            tree.child_start[new] = new_start
+            tree.child_count[new] = count
+            tree.child_capacity[new] = count
+            stack.extend(zip(range(start, start + count), range(new_start, new_start + count)))
+        return tree
@@ -0,0 +1,163 @@
+# cache of text embeddings so repeated texts don't go back to the embeddings api
+
+from collections import OrderedDict
+from typing import Dict, Optional
+import hashlib
+import os
+import re
+import threading
+import unicodedata
+import numpy as np
+
+def normalize_text(text: str) -> str:
+    """
+        Text as it is cached: unicode normalized, whitespace collapsed and trimmed
+    """
+    return re.sub(r"\s+", " ", unicodedata.normalize("NFC", text)).strip()
+
+class EmbeddingCache:
+    """
+    Two-tier embedding cache keyed by sha256 of the model name and the normalized text
+    - memory: least recently used float32 vectors, up to max_memory_bytes
+    - disk (optional): one raw float32 file per key under path, up to max_disk_bytes. The least recently
+      used files (by modification time, refreshed on every hit) are removed when the tier is full
+    hits, disk_hits and misses count lookups (disk_hits are included in hits)
+    """
+    def __init__(self, path: Optional[str] = None, max_memory_bytes: int = 64 * 1024 * 1024,
+                 max_disk_bytes: int = 1024 * 1024 * 1024):
+        self.path = path
+        self.max_memory_bytes = max_memory_bytes
+        self.max_disk_bytes = max_disk_bytes
+        self._memory: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._memory_bytes = 0
+        self._disk_bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        if path is not None:
+            os.makedirs(path, exist_ok=True)
+            self._disk_bytes = sum(entry.stat().st_size for entry in os.scandir(path) if entry.name.endswith(".f32"))
+
+    @staticmethod
+    def key(model: str, text: str) -> str:
+        return hashlib.sha256(f"{model}\0{normalize_text(text)}".encode("utf-8")).hexdigest()
+
+    def _file(self, key: str) -> str:
+        return os.path.join(self.path, f"{key}.f32")
+
+    def get(self, model: str, text: str) -> Optional[np.ndarray]:
+        """
+            Cached embedding of the text, or None
+        """
+        key = self.key(model, text)
+        with self._lock:
+            vector = self._memory.get(key)
+            if vector is not None:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return vector
+
+        vector = self._read(key)
+        with self._lock:
+            if vector is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.disk_hits += 1
+            self._remember(key, vector)
+        return vector
+
+    def put(self, model: str, text: str, vector) -> np.ndarray:
+        """
+            Cache the embedding of the text and return it as float32
+        """
+        key = self.key(model, text)
+        vector = np.asarray(vector, dtype=np.float32)
+        with self._lock:
+            self._remember(key, vector)
+        self._write(key, vector)
+        return vector
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "memory_entries": len(self._memory),
+            "memory_bytes": self._memory_bytes,
+            "disk_bytes": self._disk_bytes,
+        }
+
+    def _remember(self, key: str, vector: np.ndarray):
+        """
+            Add to the memory tier and evict least recently used vectors past the size limit
+        """
+        old = self._memory.pop(key, None)
+        if old is not None:
+            self._memory_bytes -= old.nbytes
+        self._memory[key] = vector
+        self._memory_bytes += vector.nbytes
+        while self._memory_bytes > self.max_memory_bytes and len(self._memory) > 1:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_bytes -= evicted.nbytes
+
+    def _read(self, key: str) -> Optional[np.ndarray]:
+        if self.path is None:
+            return None
+        path = self._file(key)
+        try:
+            vector = np.fromfile(path, dtype='<f4')
+            os.utime(path) # mark as recently used
+        except OSError:
+            return None
+        return vector.astype(np.float32, copy=False)
+
+    def _write(self, key: str, vector: np.ndarray):
+        if self.path is None:
+            return
+        path = self._file(key)
+        if os.path.exists(path):
+            return
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            vector.astype('<f4').tofile(tmp)
+            os.replace(tmp, path) # readers never see a partial file
+        except OSError as e:
+            print(f"Error writing embedding cache: {e}")
+            return
+        with self._lock:
+            self._disk_bytes += vector.nbytes
+            if self._disk_bytes > self.max_disk_bytes:
+                self._evict_disk()
+
+    def _evict_disk(self):
+        """
+            Remove the least recently used files until the disk tier is back to 90% of its limit
+        """
+        entries = sorted(
+            (entry for entry in os.scandir(self.path) if entry.name.endswith(".f32")),
+            key=lambda entry: entry.stat().st_mtime
+        )
+        target = int(self.max_disk_bytes * 0.9)
+        for entry in entries:
+            if self._disk_bytes <= target:
+                break
+            try:
+                size = entry.stat().st_size
+                os.remove(entry.path)
+                self._disk_bytes -= size
+            except OSError:
+                continue
+
+_default_cache: Optional[EmbeddingCache] = None
+
+def default_cache() -> EmbeddingCache:
+    """
+        Process-wide cache shared by every vector store, in memory unless EMBEDDING_CACHE_PATH names
+        a directory for the disk tier (nothing is written to the working directory by default)
+    """
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = EmbeddingCache(path=os.getenv("EMBEDDING_CACHE_PATH") or None)
+    return _default_cache
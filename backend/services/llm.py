@@ -1,20 +1,22 @@
 # llm service for reasoning and generating actions
 
-from openai import OpenAI
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 import json
-import os
+from backend.services.openai_client import OpenAIClient, shared_client
 
 class LLMService:
     """
         Interface for interacting with the LLM
     """
-    def __init__(self):
-        self.client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+    def __init__(self, client: Optional[OpenAIClient] = None):
+        self.client = client # None uses the process-wide client (see shared_client)
+
+    def _client(self) -> OpenAIClient:
+        return self.client or shared_client()
 
     async def generate(self, prompt: str) -> List[str]:
         try:
-            response = self.client.chat.completions.create(
+            response = await self._client().chat(
                 model="gpt-4",
                 messages=[{"role": "user", "content": prompt}],
                 temperature=0.7
@@ -26,7 +28,7 @@ class LLMService:
 
     async def generate_json(self, prompt: str) -> List[Dict[str, Any]]:
         try:
-            response = self.client.chat.completions.create(
+            response = await self._client().chat(
                 model="gpt-4",
                 messages=[
                     {"role": "system", "content": "Respond only with valid JSON array"},
@@ -1,5 +1,6 @@
 # Message routing service to enable communication between agents
 from typing import Dict, List, Any
+import os
 from dataclasses import dataclass
 from backend.agents.base_agent import AgentMessage
 from backend.services.vector_store import VectorStore
@@ -11,7 +12,11 @@ class MessageBus:
             - callable: functions in the agent that can be called
         """
         self._subscribers: Dict[str, List[callable]] = {} 
-        self.vector_store = VectorStore() 
+        # persisted so restarts don't re-embed everything, extra server workers open it read-only
+        self.vector_store = VectorStore(
+            path=os.getenv("VECTOR_STORE_PATH", "data/vector_store"),
+            readonly=os.getenv("VECTOR_STORE_READONLY") == "1"
+        )
     
     async def publish(self, message: AgentMessage) -> None:
         """ 
@@ -0,0 +1,97 @@
+# secondary indexes over the vector store metadata (narrow the candidates before scoring similarity)
+
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+import numpy as np
+
+class SortedColumn:
+    """
+    Numeric metadata field as values sorted with their ids, so a range is two binary searches.
+    New values are buffered and merged in on the next query
+    """
+    def __init__(self):
+        self.values = np.empty(0, dtype=np.float64)
+        self.ids = np.empty(0, dtype=np.int64)
+        self._pending: List[Tuple[float, int]] = []
+
+    def add(self, memory_id: int, value: float):
+        self._pending.append((value, memory_id))
+
+    def between(self, low: Optional[float] = None, high: Optional[float] = None) -> np.ndarray:
+        """
+            ids with low <= value <= high (open ends when None)
+        """
+        if self._pending:
+            values, ids = zip(*self._pending)
+            values = np.concatenate([self.values, np.asarray(values, dtype=np.float64)])
+            ids = np.concatenate([self.ids, np.asarray(ids, dtype=np.int64)])
+            order = np.argsort(values, kind='stable')
+            self.values, self.ids = values[order], ids[order]
+            self._pending = []
+        start = np.searchsorted(self.values, low, side='left') if low is not None else 0
+        end = np.searchsorted(self.values, high, side='right') if high is not None else len(self.values)
+        return self.ids[start:end]
+
+class MetadataIndex:
+    """
+    Secondary indexes over the metadata records of the vector store
+    - category: set of ids per category
+    - confidence, timestamp: sorted values (SortedColumn)
+    candidates() returns the ids matching every filter, deleted ids are dropped by the vector index.
+    The indexes are built from the metadata on the first filtered query (a persisted store opens without
+    reading its metadata) and kept up to date after that
+    """
+    def __init__(self):
+        self.built = False
+        self.categories: Dict[str, Set[int]] = {}
+        self.confidence = SortedColumn()
+        self.timestamp = SortedColumn()
+
+    def build(self, metadata: Iterable[Optional[Dict[str, Any]]]):
+        self.__init__()
+        self.built = True
+        for memory_id, record in enumerate(metadata):
+            if record is not None:
+                self._add(memory_id, record)
+
+    def add(self, ids: Iterable[int], records: Iterable[Dict[str, Any]]):
+        if not self.built:
+            return # picked up when the indexes are built
+        for memory_id, record in zip(ids, records):
+            self._add(int(memory_id), record)
+
+    def _add(self, memory_id: int, record: Dict[str, Any]):
+        self.categories.setdefault(record.get("category", "Unknown"), set()).add(memory_id)
+        self.confidence.add(memory_id, float(record.get("confidence", 0.0)))
+        self.timestamp.add(memory_id, float(record.get("timestamp", 0.0)))
+
+    def remove(self, memory_id: int, record: Optional[Dict[str, Any]]):
+        if self.built and record is not None:
+            self.categories.get(record.get("category", "Unknown"), set()).discard(memory_id)
+
+    def candidates(self, categories: Optional[Iterable[str]] = None, min_confidence: Optional[float] = None,
+                   timestamp_range: Optional[Tuple[Optional[float], Optional[float]]] = None) -> np.ndarray:
+        """
+            Sorted ids matching every given filter
+            - categories: ids whose category is one of these
+            - min_confidence: ids with confidence >= min_confidence
+            - timestamp_range: (start, end) inclusive, either end can be None
+        """
+        subsets = []
+        if categories is not None:
+            if isinstance(categories, str):
+                categories = [categories]
+            ids = set().union(*(self.categories.get(category, set()) for category in categories))
+            subsets.append(np.fromiter(ids, dtype=np.int64, count=len(ids)))
+        if min_confidence is not None:
+            subsets.append(self.confidence.between(low=min_confidence))
+        if timestamp_range is not None:
+            subsets.append(self.timestamp.between(*timestamp_range))
+
+        # intersect from the smallest subset up
+        subsets.sort(key=len)
+        result = np.unique(subsets[0]) if subsets else np.empty(0, dtype=np.int64)
+        for subset in subsets[1:]:
+            if not len(result):
+                break
+            result = np.intersect1d(result, subset, assume_unique=False)
+        return result
@@ -0,0 +1,108 @@
+# shared async client for the openai api (chat completions and embeddings)
+
+from typing import Any, Awaitable, Callable, Optional
+import asyncio
+import os
+import random
+import weakref
+import httpx
+from openai import AsyncOpenAI, APIConnectionError, APITimeoutError, InternalServerError, RateLimitError
+
+# failures worth retrying: the request may succeed on a later attempt
+RETRYABLE = (APIConnectionError, APITimeoutError, InternalServerError, RateLimitError)
+
+class OpenAIClient:
+    """
+    Async openai client shared by every service of a process
+    - one pooled http transport, keep-alive connections are reused across requests
+    - at most max_concurrency requests in flight, the others wait for a slot
+    - timeout per request, retried with exponential backoff and full jitter on connection errors,
+      timeouts, rate limits (honouring retry-after) and server errors
+    base_url defaults to OPENAI_BASE_URL, so the services can be pointed at a local fake endpoint,
+    transport replaces the pooled http transport (e.g. httpx.MockTransport in tests)
+    """
+    def __init__(self, api_key: Optional[str] = None, base_url: Optional[str] = None, max_concurrency: int = 32,
+                 timeout_s: float = 60.0, connect_timeout_s: float = 5.0, max_retries: int = 4,
+                 backoff_s: float = 0.5, max_backoff_s: float = 20.0,
+                 transport: Optional[httpx.AsyncBaseTransport] = None):
+        self.max_retries = max_retries     # attempts after the first one
+        self.backoff_s = backoff_s         # upper bound of the first retry delay, doubled per attempt
+        self.max_backoff_s = max_backoff_s # cap of the retry delay
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.http = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=max_concurrency, max_keepalive_connections=max_concurrency),
+            timeout=httpx.Timeout(timeout_s, connect=connect_timeout_s),
+            transport=transport
+        )
+        self.client = AsyncOpenAI(
+            api_key=api_key or os.getenv("OPENAI_API_KEY"),
+            base_url=base_url or os.getenv("OPENAI_BASE_URL") or None,
+            http_client=self.http,
+            timeout=httpx.Timeout(timeout_s, connect=connect_timeout_s),
+            max_retries=0 # retried here, outside the concurrency limit
+        )
+
+    async def request(self, call: Callable[[AsyncOpenAI], Awaitable[Any]]) -> Any:
+        """
+            Run an api call with the concurrency limit and retries
+            - call: coroutine function of the AsyncOpenAI client, e.g. lambda client: client.models.list()
+        """
+        for attempt in range(self.max_retries + 1):
+            async with self.semaphore:
+                try:
+                    return await call(self.client)
+                except RETRYABLE as e:
+                    if attempt == self.max_retries:
+                        raise
+                    error = e
+            # back off without holding a slot so other requests keep going
+            delay = random.uniform(0, min(self.max_backoff_s, self.backoff_s * 2 ** attempt))
+            delay = max(delay, self._retry_after(error))
+            print(f"OpenAI request failed ({type(error).__name__}), retrying in {delay:.2f}s")
+            await asyncio.sleep(delay)
+
+    @staticmethod
+    def _retry_after(error: Exception) -> float:
+        response = getattr(error, "response", None)
+        try:
+            return float(response.headers.get("retry-after", 0)) if response is not None else 0.0
+        except ValueError:
+            return 0.0
+
+    async def chat(self, **kwargs) -> Any:
+        """ chat.completions.create with the given arguments """
+        return await self.request(lambda client: client.chat.completions.create(**kwargs))
+
+    async def embeddings(self, **kwargs) -> Any:
+        """ embeddings.create with the given arguments """
+        return await self.request(lambda client: client.embeddings.create(**kwargs))
+
+    async def close(self):
+        await self.http.aclose()
+
+# one client per event loop: pooled connections and asyncio primitives belong to the loop that created them
+_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, OpenAIClient]" = weakref.WeakKeyDictionary()
+
+def shared_client() -> OpenAIClient:
+    """
+        Client of the running event loop, created on first use from OPENAI_MAX_CONCURRENCY (default 32),
+        OPENAI_TIMEOUT_S (default 60) and OPENAI_MAX_RETRIES (default 4)
+    """
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None:
+        client = OpenAIClient(
+            max_concurrency=int(os.getenv("OPENAI_MAX_CONCURRENCY", "32")),
+            timeout_s=float(os.getenv("OPENAI_TIMEOUT_S", "60")),
+            max_retries=int(os.getenv("OPENAI_MAX_RETRIES", "4"))
+        )
+        _clients[loop] = client
+    return client
+
+async def close_shared_client():
+    """
+        Close the pooled connections of the running event loop's client (on server shutdown)
+    """
+    client = _clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.close()
@@ -0,0 +1,71 @@
+# access statistics of stored memories (frequency and recency reinforcement)
+
+from typing import Tuple
+import math
+import time
+import numpy as np
+
+class AccessStats:
+    """
+    Access count and last access time of every memory id, in arrays indexed by id (ids are stable)
+    - record: O(1) per access
+    - bonus: reinforcement and recency terms of the blended query score, vectorized over ids
+    - hottest: most accessed ids
+    """
+    def __init__(self, capacity: int = 1024):
+        self.counts = np.zeros(capacity, dtype=np.int64)
+        self.last_access = np.zeros(capacity, dtype=np.float64) # 0 = never accessed
+        self.max_count = 0
+
+    def _reserve(self, memory_id: int):
+        if memory_id < len(self.counts):
+            return
+        capacity = max(memory_id + 1, 2 * len(self.counts))
+        self.counts = np.concatenate([self.counts, np.zeros(capacity - len(self.counts), dtype=np.int64)])
+        self.last_access = np.concatenate([self.last_access, np.zeros(capacity - len(self.last_access))])
+
+    def record(self, memory_id: int, now: float = None):
+        self._reserve(memory_id)
+        self.counts[memory_id] += 1
+        self.last_access[memory_id] = now if now is not None else time.time()
+        self.max_count = max(self.max_count, int(self.counts[memory_id]))
+
+    def clear(self, memory_id: int):
+        """
+            Forget the accesses of a deleted memory
+        """
+        if memory_id < len(self.counts):
+            self.counts[memory_id] = 0
+            self.last_access[memory_id] = 0.0
+
+    def bonus(self, ids: np.ndarray, reinforcement_weight: float, recency_weight: float,
+              half_life_s: float, now: float = None) -> np.ndarray:
+        """
+            reinforcement_weight * log(1 + count) / log(1 + max count)
+            + recency_weight * 0.5 ** (time since last access / half_life_s), both terms are within [0, weight]
+        """
+        ids = np.asarray(ids, dtype=np.int64)
+        bonus = np.zeros(len(ids), dtype=np.float64)
+        known = (ids >= 0) & (ids < len(self.counts)) # -1 pads missing results
+        if not known.any() or self.max_count == 0:
+            return bonus
+        now = now if now is not None else time.time()
+        counts = self.counts[ids[known]]
+        last_access = self.last_access[ids[known]]
+        reinforcement = np.log1p(counts) / math.log1p(self.max_count)
+        recency = np.where(last_access > 0, 0.5 ** ((now - last_access) / half_life_s), 0.0)
+        bonus[known] = reinforcement_weight * reinforcement + recency_weight * recency
+        return bonus
+
+    def hottest(self, n: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+            The n most accessed ids and their counts (ids never accessed are left out)
+        """
+        accessed = np.flatnonzero(self.counts)
+        n = min(n, len(accessed))
+        if n == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+        counts = self.counts[accessed]
+        top = np.argpartition(-counts, n - 1)[:n] if n < len(accessed) else np.arange(len(accessed))
+        top = top[np.argsort(-counts[top], kind='stable')]
+        return accessed[top], counts[top]
@@ -0,0 +1,266 @@
+# nearest neighbour index backing the vector store
+
+from typing import Dict, Optional, Tuple
+import math
+import numpy as np
+
+try:
+    import faiss
+except ImportError: # optional, the vector store uses FlatIndex unless faiss is enabled and installed
+    faiss = None
+
+def normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    """
+        Float32 copy of the vectors scaled to unit length, so inner product is cosine similarity
+    """
+    vectors = np.array(vectors, dtype=np.float32, ndmin=2)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    np.divide(vectors, norms, out=vectors, where=norms > 0)
+    return vectors
+
+class FlatIndex:
+    """
+    Exact cosine similarity index in numpy (used when faiss isn't installed)
+    - vectors live in a preallocated float32 matrix that doubles when full, rows are normalized on insert
+    - a query is one matrix-vector product plus argpartition for the top k, a batch of queries is one
+      matrix-matrix product plus argpartition per row
+    - removing a vector moves the last row into its place, so the rows in use stay contiguous
+    """
+    def __init__(self, dim: int, capacity: int = 1024):
+        self.dim = dim
+        self.size = 0                                              # rows in use
+        self.matrix = np.zeros((capacity, dim), dtype=np.float32)  # normalized vectors
+        self.ids = np.zeros(capacity, dtype=np.int64)              # id of each row
+        self._rows: Dict[int, int] = {}                            # id -> row
+
+    def __len__(self) -> int:
+        return self.size
+
+    def _grow(self, min_capacity: int):
+        capacity = max(min_capacity, 2 * len(self.matrix))
+        matrix = np.zeros((capacity, self.dim), dtype=np.float32)
+        matrix[:self.size] = self.matrix[:self.size]
+        ids = np.zeros(capacity, dtype=np.int64)
+        ids[:self.size] = self.ids[:self.size]
+        self.matrix, self.ids = matrix, ids
+
+    def add(self, ids: np.ndarray, vectors: np.ndarray):
+        """
+            Add vectors under the given ids
+        """
+        ids = np.asarray(ids, dtype=np.int64)
+        end = self.size + len(ids)
+        if end > len(self.matrix):
+            self._grow(end)
+        self._write(self.size, normalize_rows(vectors))
+        self.ids[self.size:end] = ids
+        for row, memory_id in enumerate(ids.tolist(), start=self.size):
+            self._rows[memory_id] = row
+        self.size = end
+
+    def _write(self, start: int, vectors: np.ndarray):
+        self.matrix[start:start + len(vectors)] = vectors
+
+    def remove(self, ids: np.ndarray) -> int:
+        """
+            Remove vectors by id and return how many were removed
+        """
+        removed = 0
+        for memory_id in np.asarray(ids, dtype=np.int64).tolist():
+            row = self._rows.pop(memory_id, None)
+            if row is None:
+                continue
+            last = self.size - 1
+            if row != last:
+                self._move(last, row)
+                self._rows[int(self.ids[row])] = row
+            self.size = last
+            removed += 1
+        return removed
+
+    def _move(self, source: int, target: int):
+        self.matrix[target] = self.matrix[source]
+        self.ids[target] = self.ids[source]
+
+    def search(self, query: np.ndarray, top_k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+            Most similar vectors to the query
+            - returns: (scores, ids) sorted by decreasing similarity (fewer than top_k if the index is smaller)
+        """
+        scores, ids = self.search_many(query, top_k)
+        return scores[0], ids[0]
+
+    def search_subset(self, query: np.ndarray, ids: np.ndarray, top_k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+            Most similar vectors among the given ids (only their rows are scored)
+        """
+        scores, ids = self.search_subset_many(query, ids, top_k)
+        return scores[0], ids[0]
+
+    def search_many(self, queries: np.ndarray, top_k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+            Most similar vectors to each query (one row per query)
+            - returns: (scores, ids) of shape (queries, min(top_k, len(index))), rows sorted by decreasing similarity
+        """
+        return self._query(normalize_rows(queries), self._searchable_rows(), top_k)
+
+    def search_subset_many(self, queries: np.ndarray, ids: np.ndarray, top_k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+            Most similar vectors to each query among the given ids
+        """
+        return self._query(normalize_rows(queries), self._rows_of(ids), top_k)
+
+    def _searchable_rows(self) -> Optional[np.ndarray]:
+        """ rows a query scores, None for every row in use """
+        return None
+
+    def _rows_of(self, ids: np.ndarray) -> np.ndarray:
+        rows = np.fromiter((self._rows.get(i, -1) for i in np.asarray(ids).tolist()), dtype=np.int64, count=len(ids))
+        return rows[rows >= 0]
+
+    def _query(self, queries: np.ndarray, rows: Optional[np.ndarray], top_k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+            Score the rows (every row in use when None) against the normalized queries in one matrix product
+            and keep the top k of each query
+        """
+        if rows is None:
+            return self._top_many(queries @ self.matrix[:self.size].T, np.arange(self.size), top_k)
+        return self._top_many(queries @ self.matrix[rows].T, rows, top_k)
+
+    def _top_many(self, scores: np.ndarray, rows: np.ndarray, top_k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+            top_k of the scored rows for every query (a row of scores), as (scores, ids) by decreasing score
+        """
+        top_k = min(top_k, len(rows))
+        if top_k <= 0:
+            return np.empty((len(scores), 0), dtype=np.float32), np.empty((len(scores), 0), dtype=np.int64)
+        if top_k < len(rows):
+            top = np.argpartition(-scores, top_k - 1, axis=1)[:, :top_k]
+        else:
+            top = np.broadcast_to(np.arange(len(rows)), scores.shape)
+        top = np.take_along_axis(top, np.argsort(-np.take_along_axis(scores, top, axis=1), axis=1, kind='stable'), axis=1)
+        return np.take_along_axis(scores, top, axis=1), self._ids_of(rows[top])
+
+    def _ids_of(self, rows: np.ndarray) -> np.ndarray:
+        return self.ids[rows]
+
+class FaissIndex:
+    """
+    Cosine similarity index backed by faiss (vectors are normalized, the index scores inner products)
+    - small stores use an exact flat index
+    - past ivf_threshold vectors the index is rebuilt as an IVF index with about 4 * sqrt(n) clusters,
+      nprobe clusters are scanned per query
+    - vectors are added and removed by id, so ids stay valid as the store changes
+    """
+    def __init__(self, dim: int, ivf_threshold: int = 50_000, nprobe: int = 16):
+        if faiss is None:
+            raise ImportError("faiss is not installed (pip install faiss-cpu)")
+        self.dim = dim
+        self.ivf_threshold = ivf_threshold # number of vectors before switching to IVF
+        self.nprobe = nprobe               # clusters scanned per IVF query
+        self.is_ivf = False
+        self._quantizer = None             # coarse quantizer of the IVF index (faiss doesn't own it)
+        self.index = faiss.IndexIDMap2(faiss.IndexFlatIP(dim))
+
+    def __len__(self) -> int:
+        return self.index.ntotal
+
+    def add(self, ids: np.ndarray, vectors: np.ndarray):
+        """
+            Add vectors under the given ids
+        """
+        vectors = normalize_rows(vectors)
+        self.index.add_with_ids(vectors, np.asarray(ids, dtype=np.int64))
+        if not self.is_ivf and len(self) >= self.ivf_threshold:
+            self._to_ivf()
+
+    def remove(self, ids: np.ndarray) -> int:
+        """
+            Remove vectors by id and return how many were removed
+        """
+        return int(self.index.remove_ids(np.asarray(ids, dtype=np.int64)))
+
+    def search(self, query: np.ndarray, top_k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+            Most similar vectors to the query
+            - returns: (scores, ids) sorted by decreasing similarity (fewer than top_k if the index is smaller)
+        """
+        top_k = min(top_k, len(self))
+        if top_k == 0:
+            return np.empty(0, dtype=np.float32), np.empty(0, dtype=np.int64)
+        scores, ids = self.index.search(normalize_rows(query), top_k)
+        found = ids[0] >= 0
+        return scores[0][found], ids[0][found]
+
+    def search_many(self, queries: np.ndarray, top_k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+            Most similar vectors to each query, in one faiss call
+            - returns: (scores, ids) of shape (queries, min(top_k, len(index))), ids are -1 past the results
+              an IVF query found
+        """
+        queries = normalize_rows(queries)
+        top_k = min(top_k, len(self))
+        if top_k == 0:
+            return np.empty((len(queries), 0), dtype=np.float32), np.empty((len(queries), 0), dtype=np.int64)
+        return self.index.search(queries, top_k)
+
+    def search_subset_many(self, queries: np.ndarray, ids: np.ndarray, top_k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+            Most similar vectors to each query among the given ids (ids are -1 past the results found)
+        """
+        queries = normalize_rows(queries)
+        ids = np.ascontiguousarray(ids, dtype=np.int64)
+        top_k = min(top_k, len(ids), len(self))
+        if top_k <= 0:
+            return np.empty((len(queries), 0), dtype=np.float32), np.empty((len(queries), 0), dtype=np.int64)
+        if self.is_ivf:
+            selector = faiss.IDSelectorBatch(len(ids), faiss.swig_ptr(ids))
+            return self.index.search(queries, top_k, params=faiss.SearchParametersIVF(sel=selector, nprobe=self.nprobe))
+
+        # IndexIDMap2 doesn't take search parameters, the flat index it wraps is searched over the
+        # internal positions of the ids and the results are mapped back to ids
+        id_map = faiss.vector_to_array(self.index.id_map)
+        positions = np.ascontiguousarray(np.flatnonzero(np.isin(id_map, ids)), dtype=np.int64)
+        top_k = min(top_k, len(positions))
+        if top_k <= 0:
+            return np.empty((len(queries), 0), dtype=np.float32), np.empty((len(queries), 0), dtype=np.int64)
+        selector = faiss.IDSelectorBatch(len(positions), faiss.swig_ptr(positions))
+        scores, found = self.index.index.search(queries, top_k, params=faiss.SearchParameters(sel=selector))
+        return scores, np.where(found >= 0, id_map[found], -1)
+
+    def search_subset(self, query: np.ndarray, ids: np.ndarray, top_k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+            Most similar vectors among the given ids (faiss skips the other ids while scanning)
+        """
+        scores, found = self.search_subset_many(query, ids, top_k)
+        keep = found[0] >= 0
+        return scores[0][keep], found[0][keep]
+
+    def _to_ivf(self):
+        """
+            Rebuild the flat index as an IVF index trained on the vectors it holds
+        """
+        count = len(self)
+        ids = faiss.vector_to_array(self.index.id_map).astype(np.int64)
+        vectors = self.index.index.reconstruct_n(0, count)
+
+        nlist = max(int(4 * math.sqrt(count)), 1)
+        self._quantizer = faiss.IndexFlatIP(self.dim)
+        index = faiss.IndexIVFFlat(self._quantizer, self.dim, nlist, faiss.METRIC_INNER_PRODUCT)
+        index.train(vectors)
+        index.nprobe = self.nprobe
+        index.add_with_ids(vectors, ids)
+        self.index = index
+        self.is_ivf = True
+
+def create_index(dim: int, ivf_threshold: int = 50_000, use_faiss: bool = False):
+    """
+        Index for the vector store: the numpy flat index, or faiss when it is enabled and installed
+        - use_faiss: opt in to FaissIndex (exact, then IVF past ivf_threshold vectors)
+    """
+    if not use_faiss:
+        return FlatIndex(dim)
+    if faiss is None:
+        print("faiss is not installed, using the flat index")
+        return FlatIndex(dim)
+    return FaissIndex(dim, ivf_threshold=ivf_threshold)
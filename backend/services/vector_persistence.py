@@ -0,0 +1,333 @@
+# on-disk vector store: memory-mapped vectors plus an append-only metadata sidecar
+
+from typing import Any, Dict, Iterator, Optional
+import json
+import os
+import numpy as np
+try:
+    import fcntl
+except ImportError: # not on windows, writers aren't locked there
+    fcntl = None
+from backend.services.vector_index import FlatIndex, normalize_rows
+
+MANIFEST = "manifest.json"
+METADATA = "metadata.jsonl"
+DELETED = "deleted.bin"
+LOCK = "writer.lock"
+
+def _fsync(path: str):
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+class VectorFiles:
+    """
+    Directory holding a vector store. Row i of the matrix is the vector of memory id i
+    - manifest.json: committed sizes (rows, metadata bytes, deletions) and the current generation of the arrays
+    - vectors.<generation>.npy: float32 (capacity, dim) matrix of normalized vectors, rows appended in place
+    - offsets.<generation>.npy: byte offset of each row's record in metadata.jsonl
+    - metadata.jsonl: one json record per row, append-only
+    - deleted.bin: int64 ids of deleted rows, append-only
+    Writes only append past the committed sizes and commit replaces the manifest atomically (os.replace),
+    so after a crash the store opens at its last commit and the uncommitted tail is discarded.
+    One process writes (it holds an exclusive flock on writer.lock, a second writer opens the store read-only);
+    any number of processes can open the store read-only, share its pages and refresh to see new commits
+    """
+    min_capacity = 1024 # rows reserved by the first generation of the arrays
+
+    def __init__(self, path: str, readonly: bool = False):
+        self.path = path
+        self.readonly = readonly
+        self._lock = None # open lock file of the writer
+        if not readonly:
+            os.makedirs(path, exist_ok=True)
+            self.readonly = not self._acquire_lock()
+        elif not os.path.isdir(path):
+            raise FileNotFoundError(f"No vector store at {path}")
+
+        self.manifest: Dict[str, Any] = self._read_manifest()
+        if self.manifest and not self.readonly:
+            # drop writes that never made it into a commit
+            self._truncate(METADATA, self.manifest["metadata_bytes"])
+            self._truncate(DELETED, 8 * self.manifest["deleted"])
+
+        self.vectors: Optional[np.ndarray] = None  # memory-mapped matrix (None until the dimension is known)
+        self.offsets: Optional[np.ndarray] = None  # memory-mapped metadata offsets
+        self._pending: Dict[str, Any] = {}         # manifest fields changed since the last commit
+        self._pending_generation: Optional[int] = None # generation of the arrays written since the last commit
+        if self.manifest:
+            self._map()
+
+    def _acquire_lock(self) -> bool:
+        """
+            Take the writer lock, False when another process holds it
+        """
+        if fcntl is None:
+            return True
+        self._lock = open(os.path.join(self.path, LOCK), "a")
+        try:
+            fcntl.flock(self._lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return True
+        except BlockingIOError:
+            print(f"Vector store at {self.path} is held by another writer, opening it read-only")
+            self._lock.close()
+            self._lock = None
+            return False
+
+    def close(self):
+        """
+            Release the writer lock (it is also released when the process exits)
+        """
+        if self._lock is not None:
+            self._lock.close()
+            self._lock = None
+
+    def _read_manifest(self) -> Dict[str, Any]:
+        manifest_path = os.path.join(self.path, MANIFEST)
+        if not os.path.exists(manifest_path):
+            return {}
+        with open(manifest_path) as f:
+            return json.load(f)
+
+    def _map(self):
+        mode = 'r' if self.readonly else 'r+'
+        self.vectors = np.load(self._file("vectors"), mmap_mode=mode)
+        self.offsets = np.load(self._file("offsets"), mmap_mode=mode)
+
+    def refresh(self) -> bool:
+        """
+            Pick up the commits made by the writer since the store was opened or last refreshed (read-only stores)
+            - returns: whether the committed state changed
+        """
+        if not self.readonly:
+            return False
+        for _ in range(3):
+            manifest = self._read_manifest()
+            if manifest == self.manifest:
+                return False
+            generation = self.manifest.get("generation")
+            self.manifest = manifest
+            if self.vectors is not None and manifest["generation"] == generation:
+                return True # rows were appended in place, the mapped pages already hold them
+            try:
+                self._map()
+                return True
+            except FileNotFoundError:
+                continue # the writer moved on to a newer generation and removed these files, read the manifest again
+        raise RuntimeError(f"Vector store at {self.path} changed while refreshing")
+
+    @property
+    def rows(self) -> int:
+        """ rows committed """
+        return self.manifest.get("rows", 0)
+
+    @property
+    def written(self) -> int:
+        """ rows written, committed or not """
+        return self._pending.get("rows", self.rows)
+
+    def _file(self, name: str, generation: Optional[int] = None) -> str:
+        generation = self.manifest["generation"] if generation is None else generation
+        return os.path.join(self.path, f"{name}.{generation}.npy")
+
+    def _truncate(self, name: str, size: int):
+        path = os.path.join(self.path, name)
+        if os.path.exists(path) and os.path.getsize(path) > size:
+            with open(path, "r+b") as f:
+                f.truncate(size)
+
+    def deleted_ids(self) -> np.ndarray:
+        """
+            ids deleted up to the last commit
+        """
+        path = os.path.join(self.path, DELETED)
+        if not self.manifest.get("deleted"):
+            return np.empty(0, dtype=np.int64)
+        return np.fromfile(path, dtype='<i8', count=self.manifest["deleted"])
+
+    def reserve(self, capacity: int, dim: int):
+        """
+            Make room for capacity rows. The arrays are copied into a new generation of files, which
+            becomes current at the next commit (readers keep the pages of the old files they mapped)
+        """
+        if self.vectors is not None and capacity <= len(self.vectors):
+            return
+        if self.vectors is not None:
+            capacity = max(capacity, 2 * len(self.vectors))
+            dim = self.vectors.shape[1]
+        capacity = max(capacity, self.min_capacity)
+        previous = self._pending_generation
+        generation = (previous if previous is not None else self.manifest.get("generation", -1)) + 1
+        vectors = np.lib.format.open_memmap(self._file("vectors", generation), mode='w+', dtype=np.float32, shape=(capacity, dim))
+        offsets = np.lib.format.open_memmap(self._file("offsets", generation), mode='w+', dtype=np.int64, shape=(capacity,))
+        if self.vectors is not None:
+            vectors[:self.written] = self.vectors[:self.written]
+            offsets[:self.written] = self.offsets[:self.written]
+        self.vectors, self.offsets = vectors, offsets
+        self._pending_generation = generation
+        if previous is not None:
+            # grown twice between commits, the files of the first growth were never committed
+            for name in ("vectors", "offsets"):
+                os.remove(self._file(name, previous))
+
+    def append(self, vectors: np.ndarray, records: list, start: int):
+        """
+            Write rows start.. and their metadata records past the committed end (visible after commit)
+        """
+        end = start + len(vectors)
+        self.reserve(end, vectors.shape[1])
+        self.vectors[start:end] = vectors
+
+        path = os.path.join(self.path, METADATA)
+        offset = self._pending.get("metadata_bytes", self.manifest.get("metadata_bytes", 0))
+        lines = [(json.dumps(record) + "\n").encode("utf-8") for record in records]
+        with open(path, "ab") as f:
+            for row, line in enumerate(lines, start=start):
+                self.offsets[row] = offset
+                f.write(line)
+                offset += len(line)
+        self._pending.update(rows=end, metadata_bytes=offset, dim=int(self.vectors.shape[1]))
+
+    def delete(self, ids: np.ndarray):
+        with open(os.path.join(self.path, DELETED), "ab") as f:
+            f.write(np.asarray(ids, dtype='<i8').tobytes())
+        self._pending["deleted"] = self._pending.get("deleted", self.manifest.get("deleted", 0)) + len(ids)
+
+    def commit(self):
+        """
+            Make every write since the last commit durable and visible
+        """
+        if not self._pending and self._pending_generation is None:
+            return
+        self.vectors.flush()
+        self.offsets.flush()
+        for name in (METADATA, DELETED):
+            if os.path.exists(os.path.join(self.path, name)):
+                _fsync(os.path.join(self.path, name))
+
+        old_generation = self.manifest.get("generation")
+        manifest = dict(self.manifest, capacity=len(self.vectors), **self._pending)
+        manifest.setdefault("metadata_bytes", 0)
+        manifest.setdefault("deleted", 0)
+        if self._pending_generation is not None:
+            manifest["generation"] = self._pending_generation
+
+        tmp = os.path.join(self.path, MANIFEST + ".tmp")
+        with open(tmp, "w") as f:
+            json.dump(manifest, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, os.path.join(self.path, MANIFEST))
+        self.manifest = manifest
+        self._pending = {}
+        if self._pending_generation is not None and old_generation is not None:
+            for name in ("vectors", "offsets"):
+                os.remove(self._file(name, old_generation))
+        self._pending_generation = None
+
+class MetadataLog:
+    """
+    Metadata of a persisted store, read lazily: a record is parsed from metadata.jsonl the first time it
+    is accessed, so opening the store doesn't read the sidecar. Behaves like the store's metadata list
+    (deleted entries are None)
+    """
+    def __init__(self, files: VectorFiles):
+        self.files = files
+        self._size = files.rows
+        self._cache: Dict[int, Optional[Dict[str, Any]]] = {}
+        self._deleted = set(files.deleted_ids().tolist())
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __getitem__(self, idx: int) -> Optional[Dict[str, Any]]:
+        idx = int(idx)
+        if idx < 0 or idx >= self._size:
+            raise IndexError(idx)
+        if idx in self._deleted:
+            return None
+        record = self._cache.get(idx)
+        if record is None:
+            start = int(self.files.offsets[idx])
+            with open(os.path.join(self.files.path, METADATA), "rb") as f:
+                f.seek(start)
+                record = json.loads(f.readline())
+            self._cache[idx] = record
+        return record
+
+    def __setitem__(self, idx: int, value):
+        if value is not None:
+            raise ValueError("persisted metadata is append-only, only deletion (None) is supported")
+        self._deleted.add(int(idx))
+        self._cache.pop(int(idx), None)
+
+    def __iter__(self) -> Iterator[Optional[Dict[str, Any]]]:
+        for idx in range(self._size):
+            yield self[idx]
+
+    def append(self, record: Dict[str, Any]):
+        self._cache[self._size] = record
+        self._size += 1
+
+    def refresh(self):
+        """
+            Follow the committed rows and deletions of the files (after VectorFiles.refresh)
+        """
+        self._size = self.files.rows
+        self._deleted = set(self.files.deleted_ids().tolist())
+
+class MappedFlatIndex(FlatIndex):
+    """
+    FlatIndex over the memory-mapped matrix of a persisted store (row i holds id i).
+    Rows are only appended, deleted rows are masked out of queries, so the committed rows never change
+    """
+    def __init__(self, files: VectorFiles, dim: int):
+        self.files = files
+        self.dim = dim
+        self.size = files.rows
+        self.matrix = files.vectors if files.vectors is not None else np.zeros((0, dim), dtype=np.float32)
+        self.live = np.ones(self.size, dtype=bool)
+        self.live[files.deleted_ids()] = False
+
+    def refresh(self):
+        """
+            Follow the committed rows and deletions of the files (after VectorFiles.refresh)
+        """
+        self.matrix = self.files.vectors
+        self.live = np.concatenate([self.live, np.ones(self.files.rows - self.size, dtype=bool)])
+        self.live[self.files.deleted_ids()] = False
+        self.size = self.files.rows
+
+    def __len__(self) -> int:
+        return int(self.live.sum())
+
+    def _ids_of(self, rows: np.ndarray) -> np.ndarray:
+        return rows.astype(np.int64) # row i holds id i
+
+    def add(self, ids: np.ndarray, vectors: np.ndarray, records: list = None):
+        ids = np.asarray(ids, dtype=np.int64)
+        if len(ids) and (ids != np.arange(self.size, self.size + len(ids))).any():
+            raise ValueError("a persisted store appends rows in id order")
+        self.files.append(normalize_rows(vectors), records or [{} for _ in ids], start=self.size)
+        self.matrix = self.files.vectors
+        self.size += len(ids)
+        self.live = np.concatenate([self.live, np.ones(len(ids), dtype=bool)])
+
+    def remove(self, ids: np.ndarray) -> int:
+        ids = np.asarray(ids, dtype=np.int64)
+        ids = ids[(ids >= 0) & (ids < self.size)]
+        ids = ids[self.live[ids]]
+        self.live[ids] = False
+        if len(ids):
+            self.files.delete(ids)
+        return len(ids)
+
+    def _searchable_rows(self) -> Optional[np.ndarray]:
+        return None if self.live.all() else np.flatnonzero(self.live)
+
+    def _rows_of(self, ids: np.ndarray) -> np.ndarray:
+        rows = np.asarray(ids, dtype=np.int64)
+        rows = rows[(rows >= 0) & (rows < self.size)]
+        return rows[self.live[rows]]
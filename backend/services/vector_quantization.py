@@ -0,0 +1,124 @@
+# compact vector index: quantized codes in memory, full precision vectors on disk for re-ranking
+
+from typing import Optional, Tuple
+import tempfile
+import numpy as np
+from backend.services.vector_index import FlatIndex, normalize_rows
+
+CODE_TYPES = {"int8": np.int8, "float16": np.float16}
+
+def recall_at_k(index, queries: np.ndarray, top_k: int = 10) -> float:
+    """
+        Fraction of the exact top k neighbours that the index returns, averaged over the queries
+        (exact neighbours are computed from the full precision vectors of a QuantizedIndex)
+        - index: QuantizedIndex to evaluate
+        - queries: (queries, dim) query vectors
+    """
+    queries = normalize_rows(queries)
+    _, found = index.search_many(queries, top_k)
+    _, exact = index.exact_search_many(queries, top_k)
+    if not exact.size:
+        return 1.0
+    hits = sum(len(np.intersect1d(f, e)) for f, e in zip(found, exact))
+    return hits / exact.size
+
+class QuantizedIndex(FlatIndex):
+    """
+    FlatIndex keeping only quantized codes of the vectors in memory
+    - int8: each normalized vector scaled so its largest component is 127 and rounded (scale kept per row),
+      4x smaller than float32
+    - float16: the vectors as half floats, 2x smaller than float32
+    A query scans the codes for rerank * top_k candidates, then re-ranks the candidates exactly with the
+    float32 vectors, which are spilled to a memory-mapped file (under spill_dir, a temporary file that is
+    removed when the index is dropped) so only the pages of the candidates are read
+    """
+    block_rows = 4096 # codes converted to float32 at once while scanning
+
+    def __init__(self, dim: int, quantization: str = "int8", rerank: int = 4, capacity: int = 1024,
+                 spill_dir: Optional[str] = None):
+        if quantization not in CODE_TYPES:
+            raise ValueError(f"unknown quantization {quantization!r}, expected one of {sorted(CODE_TYPES)}")
+        self.quantization = quantization
+        self.rerank = rerank       # candidates re-ranked exactly per result
+        self.spill_dir = spill_dir
+        self.dim = dim
+        self.size = 0
+        self.matrix = np.zeros((capacity, dim), dtype=CODE_TYPES[quantization]) # codes
+        self.scales = np.ones(capacity, dtype=np.float32)                       # int8 code -> float scale per row
+        self.originals = self._spill(capacity)                                  # normalized float32 vectors
+        self.ids = np.zeros(capacity, dtype=np.int64)
+        self._rows = {}
+
+    @property
+    def nbytes(self) -> int:
+        """ bytes held in memory by the codes, scales and ids (the originals are on disk) """
+        return self.matrix.nbytes + self.scales.nbytes + self.ids.nbytes
+
+    def _spill(self, capacity: int) -> np.ndarray:
+        spill = tempfile.TemporaryFile(dir=self.spill_dir)
+        return np.memmap(spill, dtype=np.float32, mode='w+', shape=(capacity, self.dim))
+
+    def _grow(self, min_capacity: int):
+        capacity = max(min_capacity, 2 * len(self.matrix))
+        matrix = np.zeros((capacity, self.dim), dtype=self.matrix.dtype)
+        matrix[:self.size] = self.matrix[:self.size]
+        scales = np.ones(capacity, dtype=np.float32)
+        scales[:self.size] = self.scales[:self.size]
+        originals = self._spill(capacity)
+        originals[:self.size] = self.originals[:self.size]
+        ids = np.zeros(capacity, dtype=np.int64)
+        ids[:self.size] = self.ids[:self.size]
+        self.matrix, self.scales, self.originals, self.ids = matrix, scales, originals, ids
+
+    def _write(self, start: int, vectors: np.ndarray):
+        end = start + len(vectors)
+        self.originals[start:end] = vectors
+        if self.quantization == "int8":
+            scales = np.abs(vectors).max(axis=1) / 127
+            scales[scales == 0] = 1.0
+            self.matrix[start:end] = np.rint(vectors / scales[:, None])
+            self.scales[start:end] = scales
+        else:
+            self.matrix[start:end] = vectors
+
+    def _move(self, source: int, target: int):
+        super()._move(source, target)
+        self.scales[target] = self.scales[source]
+        self.originals[target] = self.originals[source]
+
+    def _coarse(self, queries: np.ndarray, rows: np.ndarray) -> np.ndarray:
+        """
+            (queries, rows) approximate similarities from the codes, scanned a block of rows at a time so
+            the float32 copy of the codes stays small
+        """
+        scores = np.empty((len(queries), len(rows)), dtype=np.float32)
+        for start in range(0, len(rows), self.block_rows):
+            block = rows[start:start + self.block_rows]
+            codes = self.matrix[block].astype(np.float32)
+            scores[:, start:start + len(block)] = (queries @ codes.T) * self.scales[block]
+        return scores
+
+    def _query(self, queries: np.ndarray, rows: Optional[np.ndarray], top_k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+            Coarse scan of the codes for rerank * top_k candidates per query, then exact scores of the candidates
+        """
+        rows = np.arange(self.size) if rows is None else rows
+        count = min(self.rerank * top_k, len(rows))
+        if count <= 0:
+            return np.empty((len(queries), 0), dtype=np.float32), np.empty((len(queries), 0), dtype=np.int64)
+        coarse = self._coarse(queries, rows)
+        if count < len(rows):
+            candidates = rows[np.argpartition(-coarse, count - 1, axis=1)[:, :count]]
+        else:
+            candidates = np.broadcast_to(rows, coarse.shape)
+        exact = np.einsum('qcd,qd->qc', self.originals[candidates], queries)
+        top_k = min(top_k, candidates.shape[1])
+        top = np.argsort(-exact, axis=1, kind='stable')[:, :top_k]
+        return np.take_along_axis(exact, top, axis=1), self.ids[np.take_along_axis(candidates, top, axis=1)]
+
+    def exact_search_many(self, queries: np.ndarray, top_k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+            Exact top k over the full precision vectors (reads all of them, used to measure recall)
+        """
+        rows = np.arange(self.size)
+        return self._top_many(normalize_rows(queries) @ self.originals[:self.size].T, rows, top_k)
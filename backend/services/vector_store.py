@@ -1,9 +1,15 @@
 # long term memory storage
 
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Iterable, Iterator, Optional, Tuple
+import asyncio
 import numpy as np
-from openai import OpenAI
-import os
+from backend.services.openai_client import OpenAIClient, shared_client
+from backend.services.vector_index import create_index
+from backend.services.vector_quantization import QuantizedIndex, recall_at_k
+from backend.services.vector_persistence import VectorFiles, MetadataLog, MappedFlatIndex
+from backend.services.embedding_cache import EmbeddingCache, default_cache
+from backend.services.metadata_index import MetadataIndex
+from backend.services.reinforcement import AccessStats
 
 class VectorStore:
     """
@@ -11,74 +17,378 @@ class VectorStore:
     - convert and store user insights as vectors
     - retrieve relevant memories to answer a query
     - reinforce frequently accessed memories
+    vectors are searched with a normalized float32 matrix, or with use_faiss a faiss index when faiss is
+    installed (exact for small stores, IVF past ivf_threshold vectors). ids are positions in the metadata list
+    with a path the store is persisted there (see VectorFiles) and searched over the memory-mapped matrix,
+    so it opens without re-embedding anything. readonly opens it for search only (e.g. extra server workers),
+    queries and listings refresh it to see the writer's new commits
+    quantization ("int8" or "float16") keeps an in-memory store as compact codes, queries re-rank rerank * top_k
+    candidates with the exact vectors (see QuantizedIndex, evaluate_recall measures the recall)
     """
-    def __init__(self):
-        self.client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-        self.vectors = []  # Store vectors in memory for now
-        self.metadata = []  # Store corresponding metadata
-        self.access_counts = {} # track access count for each memory
+    def __init__(self, ivf_threshold: int = 50_000, path: Optional[str] = None, readonly: bool = False,
+                 cache: Optional[EmbeddingCache] = None, batch_size: int = 256, max_concurrency: int = 4,
+                 quantization: Optional[str] = None, rerank: int = 4, client: Optional[OpenAIClient] = None,
+                 use_faiss: bool = False):
+        self.client = client # None uses the process-wide client (see shared_client)
+        self.embedding_model = "text-embedding-ada-002"
+        self.cache = cache or default_cache() # embeddings of texts seen before (shared between stores)
+        self.batch_size = batch_size # texts per embeddings request in bulk inserts
+        self.max_concurrency = max_concurrency # embeddings requests in flight at once in bulk inserts
+        self.metadata = []  # Store corresponding metadata (None once deleted)
+        self.access = AccessStats() # access count and last access time per memory id (reinforcement)
+        self.use_faiss = use_faiss # search an in-memory store with faiss instead of the flat index
+        self.ivf_threshold = ivf_threshold # store size at which the faiss index switches to IVF
+        self.index = None # vector index, created with the first embedding (its size sets the dimension)
+        self.files = None # on-disk storage of a persisted store
+        self.filters = MetadataIndex() # category, confidence and timestamp indexes for filtered queries
+        self.quantization = quantization # code type of an in-memory store (None keeps float32 vectors)
+        self.rerank = rerank # candidates re-ranked exactly per result with quantization
+        if path is not None:
+            if quantization is not None:
+                print("Quantization applies to in-memory stores, the persisted store keeps float32 vectors")
+            self.files = VectorFiles(path, readonly=readonly)
+            self.metadata = MetadataLog(self.files)
+            if self.files.rows:
+                self.index = MappedFlatIndex(self.files, self.files.manifest["dim"])
+
+    def _client(self) -> OpenAIClient:
+        return self.client or shared_client()
 
     async def convert_embedding(self, text: str) -> List[float]:
+        cached = self.cache.get(self.embedding_model, text)
+        if cached is not None:
+            return cached.tolist()
         try:
-            response = self.client.embeddings.create(
-                model="text-embedding-ada-002",
+            response = await self._client().embeddings(
+                model=self.embedding_model,
                 input=text
             )
             print("embedding response: ", response)
-            return response.data[0].embedding
+            embedding = response.data[0].embedding
+            self.cache.put(self.embedding_model, text, embedding)
+            return embedding
         except Exception as e:
             print(f"Error converting to embedding: {e}")
             return []
 
     async def store_embedding(self, text: str, metadata: Dict[str, Any] = None) -> str:
+        if self.files is not None and self.files.readonly:
+            print("Vector store is open read-only")
+            return ""
         embedding = await self.convert_embedding(text)
         if embedding:
-            self.vectors.append(embedding)
-            self.metadata.append(metadata or {})
-            return str(len(self.vectors) - 1)  # Return index as ID
-            print("embedding stored")
+            memory_id = len(self.metadata)
+            self._append(np.asarray([embedding], dtype=np.float32), [metadata or {}])
+            return str(memory_id)  # Return index as ID
         return ""
 
-    async def query_embedding(self, query_vector: List[float], top_k: int = 5) -> Dict:
-        if not self.vectors or not query_vector:
+    async def convert_embeddings(self, texts: List[str]) -> List[Optional[np.ndarray]]:
+        """
+            Embed many texts: cached texts are skipped, the rest are sent in batches of batch_size
+            with at most max_concurrency requests in flight
+            - returns: float32 embedding per text (None where the request failed)
+        """
+        embeddings: List[Optional[np.ndarray]] = [self.cache.get(self.embedding_model, text) for text in texts]
+        missing = list(dict.fromkeys(text for text, embedding in zip(texts, embeddings) if embedding is None))
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async def embed(chunk: List[str]) -> Dict[str, np.ndarray]:
+            async with semaphore:
+                try:
+                    response = await self._client().embeddings(model=self.embedding_model, input=chunk)
+                except Exception as e:
+                    print(f"Error converting batch to embeddings: {e}")
+                    return {}
+            return {chunk[item.index]: self.cache.put(self.embedding_model, chunk[item.index], item.embedding) for item in response.data}
+
+        chunks = [missing[i:i + self.batch_size] for i in range(0, len(missing), self.batch_size)]
+        embedded: Dict[str, np.ndarray] = {}
+        for result in await asyncio.gather(*(embed(chunk) for chunk in chunks)):
+            embedded.update(result)
+        return [embedding if embedding is not None else embedded.get(text) for text, embedding in zip(texts, embeddings)]
+
+    async def store_embeddings(self, texts: List[str], metadatas: List[Dict[str, Any]] = None) -> List[str]:
+        """
+            Embed and store many texts with one index insert (and one commit for a persisted store)
+            - metadatas: metadata of each text
+            - returns: id of each stored text ("" where embedding failed)
+        """
+        if self.files is not None and self.files.readonly:
+            print("Vector store is open read-only")
+            return [""] * len(texts)
+        metadatas = metadatas or [{} for _ in texts]
+        embeddings = await self.convert_embeddings(texts)
+        stored = [i for i, embedding in enumerate(embeddings) if embedding is not None]
+        if not stored:
+            return [""] * len(texts)
+
+        ids = self._append(np.stack([embeddings[i] for i in stored]), [metadatas[i] or {} for i in stored])
+
+        result = [""] * len(texts)
+        for i, memory_id in zip(stored, ids.tolist()):
+            result[i] = str(memory_id)
+        return result
+
+    async def delete_embedding(self, memory_id: str) -> bool:
+        """
+            Remove a stored embedding, its id is not reused
+        """
+        if self.files is not None and self.files.readonly:
+            print("Vector store is open read-only")
+            return False
+        idx = int(memory_id)
+        if idx < 0 or idx >= len(self.metadata) or self.metadata[idx] is None:
+            return False
+        self.index.remove(np.array([idx]))
+        self.filters.remove(idx, self.metadata[idx])
+        self.metadata[idx] = None
+        self.access.clear(idx)
+        self._commit()
+        return True
+
+    def _append(self, vectors: np.ndarray, records: List[Dict[str, Any]]) -> np.ndarray:
+        """
+            Add embeddings and their metadata under the next ids, in one index insert and one commit
+        """
+        ids = np.arange(len(self.metadata), len(self.metadata) + len(records))
+        if self.index is None:
+            self.index = self._create_index(vectors.shape[1])
+        if self.files is not None:
+            self.index.add(ids, vectors, records=records)
+        else:
+            self.index.add(ids, vectors)
+        for record in records:
+            self.metadata.append(record)
+        self.filters.add(ids.tolist(), records)
+        self._commit()
+        return ids
+
+    def _create_index(self, dim: int):
+        if self.files is not None:
+            # the persisted matrix is memory-mapped already, its pages are loaded on demand
+            return MappedFlatIndex(self.files, dim)
+        if self.quantization is not None:
+            return QuantizedIndex(dim, quantization=self.quantization, rerank=self.rerank)
+        return create_index(dim, ivf_threshold=self.ivf_threshold, use_faiss=self.use_faiss)
+
+    def evaluate_recall(self, query_vectors=None, top_k: int = 10, samples: int = 100) -> float:
+        """
+            recall@k of the quantized index against exact search over the same vectors (1.0 without quantization)
+            - query_vectors: queries to evaluate, by default a sample of the stored vectors
+            - samples: number of stored vectors sampled as queries
+        """
+        if not isinstance(self.index, QuantizedIndex) or not len(self.index):
+            return 1.0
+        if query_vectors is None:
+            rows = np.random.default_rng(0).choice(len(self.index), min(samples, len(self.index)), replace=False)
+            query_vectors = self.index.originals[np.sort(rows)]
+        return recall_at_k(self.index, np.asarray(query_vectors, dtype=np.float32), top_k)
+
+    def refresh(self):
+        """
+            Pick up the commits of the writing process (read-only persisted stores, no-op otherwise)
+        """
+        if self.files is None or not self.files.readonly:
+            return
+        rows, deleted = self.files.rows, self.files.manifest.get("deleted", 0)
+        if not self.files.refresh():
+            return
+        self.metadata.refresh()
+        if self.index is None:
+            if self.files.rows:
+                self.index = MappedFlatIndex(self.files, self.files.manifest["dim"])
+        else:
+            self.index.refresh()
+        if self.filters.built:
+            if self.files.manifest["deleted"] != deleted:
+                self.filters = MetadataIndex() # rebuilt by the next filtered query
+            else:
+                new_ids = list(range(rows, self.files.rows))
+                self.filters.add(new_ids, [self.metadata[idx] for idx in new_ids])
+
+    def _commit(self):
+        """
+            Make the changes of a persisted store durable (no-op in memory)
+        """
+        if self.files is not None:
+            self.files.commit()
+
+    async def query_embedding(self, query_vector: List[float], top_k: int = 5, categories: Optional[Iterable[str]] = None,
+                              min_confidence: Optional[float] = None,
+                              timestamp_range: Optional[Tuple[Optional[float], Optional[float]]] = None,
+                              reinforcement_weight: float = 0.0, recency_weight: float = 0.0,
+                              half_life_s: float = 7 * 24 * 3600) -> Dict:
+        """
+            Most similar stored contexts to the query vector
+            - categories: only contexts in one of these categories
+            - min_confidence: only contexts with at least this confidence
+            - timestamp_range: only contexts with start <= timestamp <= end (either end can be None)
+            - reinforcement_weight, recency_weight, half_life_s: rank by similarity plus a bonus for memories
+              accessed often and recently (see AccessStats.bonus), score is then the blended score
+            with filters only the matching contexts are scored (candidates come from the metadata indexes)
+        """
+        if not query_vector:
             print("No vectors stored or invalid query vector")
             return {"matches": []}
+        response = await self.query_embeddings(
+            [query_vector], top_k, categories=categories, min_confidence=min_confidence, timestamp_range=timestamp_range,
+            reinforcement_weight=reinforcement_weight, recency_weight=recency_weight, half_life_s=half_life_s
+        )
+        return response["results"][0]
+
+    async def query_embeddings(self, query_vectors, top_k: int = 5, categories: Optional[Iterable[str]] = None,
+                               min_confidence: Optional[float] = None,
+                               timestamp_range: Optional[Tuple[Optional[float], Optional[float]]] = None,
+                               reinforcement_weight: float = 0.0, recency_weight: float = 0.0,
+                               half_life_s: float = 7 * 24 * 3600) -> Dict:
+        """
+            Most similar stored contexts to each of a batch of query vectors, scored with one matrix product
+            - query_vectors: (queries, dim) matrix or list of vectors
+            - filters and weights as in query_embedding, shared by every query
+            - returns: {"results": [{"matches": [...]} per query]}
+        """
+        empty = {"results": [{"matches": []} for _ in range(len(query_vectors))]}
+        self.refresh()
+        if self.index is None or not len(self.index) or not len(query_vectors):
+            print("No vectors stored or invalid query vector")
+            return empty
         
         try:
-            # Convert lists to numpy arrays
-            query_array = np.array(query_vector)
-            vectors_array = np.array(self.vectors)
-            
-            # Calculate similarities
-            similarities = np.dot(vectors_array, query_array) / (
-                np.linalg.norm(vectors_array, axis=1) * np.linalg.norm(query_array)
-            )
-            
-            # Get top k indices
-            top_indices = np.argsort(similarities)[-top_k:][::-1]
+            # cosine similarity against the normalized vectors, top k by decreasing score
+            queries = np.asarray(query_vectors, dtype=np.float32)
+            candidates = None
+            if categories is not None or min_confidence is not None or timestamp_range is not None:
+                if not self.filters.built:
+                    self.filters.build(self.metadata)
+                candidates = self.filters.candidates(categories, min_confidence, timestamp_range)
+            ranked = self._ranked(queries, top_k, candidates, reinforcement_weight, recency_weight, half_life_s)
             
             # create matches
-            matches = []
-            for idx in top_indices:
-                matches.append({
-                    "id": str(idx),
-                    "text": self.metadata[idx].get("text", ""),
-                    "score": float(similarities[idx]),
-                    "metadata": self.metadata[idx]
-                })
+            results = []
+            for scores, similarities, top_indices in ranked:
+                matches = []
+                for idx, score, similarity in zip(top_indices.tolist(), scores, similarities):
+                    matches.append({
+                        "id": str(idx),
+                        "text": self.metadata[idx].get("text", ""),
+                        "score": float(score),
+                        "similarity": float(similarity),
+                        "metadata": self.metadata[idx]
+                    })
+                results.append({"matches": matches})
             
-            print(f"Found {len(matches)} similar contexts")
-            return {"matches": matches}
+            print(f"Found {sum(len(result['matches']) for result in results)} similar contexts for {len(results)} queries")
+            return {"results": results}
             
         except Exception as e:
             print(f"Error in similarity calculation: {e}")
-            return {"matches": []}
+            return empty
+
+    def _ranked(self, queries: np.ndarray, top_k: int, candidates: Optional[np.ndarray], reinforcement_weight: float,
+                recency_weight: float, half_life_s: float) -> List[Tuple[np.ndarray, np.ndarray, np.ndarray]]:
+        """
+            Top k ids of each query by similarity, or by blended score when a reinforcement weight is set
+            - returns: (scores, similarities, ids) per query
+        """
+        def search(rows: np.ndarray, k: int):
+            if candidates is None:
+                return self.index.search_many(rows, k)
+            return self.index.search_subset_many(rows, candidates, k)
+
+        if not reinforcement_weight and not recency_weight:
+            similarities, ids = search(queries, top_k)
+            return [(s[i >= 0], s[i >= 0], i[i >= 0]) for s, i in zip(similarities, ids)]
+
+        # fetch more than top_k by similarity and re-rank. The bonus is at most the sum of the weights, so
+        # a query's result is exact once its k-th blended score beats its lowest fetched similarity plus that
+        # bound, the other queries are fetched again deeper
+        max_bonus = reinforcement_weight + recency_weight
+        total = len(self.index) if candidates is None else len(candidates)
+        fetch = min(4 * top_k, total)
+        results = [None] * len(queries)
+        pending = np.arange(len(queries))
+        while len(pending):
+            similarities, ids = search(queries[pending], fetch)
+            bonus = self.access.bonus(ids.ravel(), reinforcement_weight, recency_weight, half_life_s).reshape(ids.shape)
+            blended = np.where(ids >= 0, similarities + bonus, -np.inf)
+            order = np.argsort(-blended, axis=1, kind='stable')[:, :top_k]
+            exhausted = fetch >= total or ids.shape[1] < fetch
+            for row, query in enumerate(pending.tolist()):
+                top = order[row][ids[row, order[row]] >= 0]
+                if (exhausted or ids[row, -1] < 0
+                        or (len(top) == top_k and blended[row, top[-1]] >= similarities[row, -1] + max_bonus)):
+                    results[query] = (blended[row, top], similarities[row, top], ids[row, top])
+            pending = np.array([query for query in pending.tolist() if results[query] is None], dtype=np.int64)
+            fetch = min(4 * fetch, total)
+        return results
+
+    def list_contexts(self, cursor: Optional[str] = None, limit: int = 100, categories: Optional[Iterable[str]] = None,
+                      min_confidence: Optional[float] = None,
+                      timestamp_range: Optional[Tuple[Optional[float], Optional[float]]] = None) -> Dict[str, Any]:
+        """
+            Stored contexts in id (insertion) order, one page at a time
+            - cursor: next_cursor of the previous page, None for the first page
+            - limit: contexts per page
+            - categories, min_confidence, timestamp_range: filters as in query_embedding
+            - returns: {"contexts": [metadata with its id], "next_cursor": None after the last page}
+            a page only reads the records it returns (plus the filter indexes when filtering)
+        """
+        self.refresh()
+        start = int(cursor) if cursor else 0
+        if start < 0:
+            raise ValueError(f"Invalid cursor: {cursor}")
+        if categories is not None or min_confidence is not None or timestamp_range is not None:
+            if not self.filters.built:
+                self.filters.build(self.metadata)
+            ids = self.filters.candidates(categories, min_confidence, timestamp_range)
+            ids = ids[np.searchsorted(ids, start):].tolist()
+        else:
+            ids = range(start, len(self.metadata))
+
+        contexts = []
+        next_cursor = None
+        for idx in ids:
+            record = self.metadata[idx]
+            if record is None:
+                continue # deleted
+            if len(contexts) == limit:
+                next_cursor = str(idx)
+                break
+            contexts.append(dict(record, id=str(idx)))
+        return {"contexts": contexts, "next_cursor": next_cursor}
+
+    def iter_contexts(self, cursor: Optional[str] = None, page_size: int = 256, **filters) -> Iterator[Dict[str, Any]]:
+        """
+            Every stored context from the cursor on, read a page at a time (filters as in list_contexts)
+        """
+        while True:
+            page = self.list_contexts(cursor=cursor, limit=page_size, **filters)
+            yield from page["contexts"]
+            cursor = page["next_cursor"]
+            if cursor is None:
+                return
+
+    def hottest(self, n: int = 10) -> List[Dict[str, Any]]:
+        """
+            The n most accessed memories with their access counts
+        """
+        ids, counts = self.access.hottest(n)
+        return [
+            {
+                "id": str(idx),
+                "text": self.metadata[idx].get("text", ""),
+                "access_count": int(count),
+                "last_access": float(self.access.last_access[idx]),
+                "metadata": self.metadata[idx]
+            }
+            for idx, count in zip(ids.tolist(), counts.tolist())
+            if self.metadata[idx] is not None
+        ]
     
     async def reinforce_memory(self, memory_id: str):
         """
-        Reinforce a memory based on frequency of access
+        Reinforce a memory based on frequency and recency of access (O(1), ids don't move)
         """
-        # increment access count
-        self.access_counts[memory_id] = self.access_counts.get(memory_id, 0) + 1
-        # update vector store by moving it to the front of the list
-        self.vectors.insert(0, self.vectors.pop(memory_id))
+        idx = int(memory_id)
+        if 0 <= idx < len(self.metadata):
+            self.access.record(idx)
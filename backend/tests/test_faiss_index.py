@@ -0,0 +1,90 @@
+# FaissIndex against the exact numpy index: add, remove, filtered and batched search, and the IVF switch
+import numpy as np
+import pytest
+from backend.services.vector_index import FlatIndex, create_index
+
+faiss = pytest.importorskip("faiss")
+from backend.services.vector_index import FaissIndex
+
+DIM = 16
+
+def _vectors(count, seed=0):
+    return np.random.default_rng(seed).standard_normal((count, DIM)).astype(np.float32)
+
+def _indexes(count, ivf_threshold=50_000):
+    vectors = _vectors(count)
+    ids = np.arange(count)
+    flat, index = FlatIndex(DIM), FaissIndex(DIM, ivf_threshold=ivf_threshold)
+    flat.add(ids, vectors)
+    index.add(ids, vectors)
+    return flat, index, vectors
+
+def test_create_index_is_opt_in():
+    assert isinstance(create_index(DIM), FlatIndex)
+    assert isinstance(create_index(DIM, use_faiss=True), FaissIndex)
+
+def test_search_matches_flat_index():
+    flat, index, vectors = _indexes(200)
+    expected_scores, expected = flat.search(vectors[3], 10)
+    scores, found = index.search(vectors[3], 10)
+    assert found[0] == 3
+    assert np.array_equal(found, expected)
+    assert np.allclose(scores, expected_scores, atol=1e-5)
+
+def test_remove():
+    flat, index, vectors = _indexes(200)
+    assert index.remove(np.array([3, 4, 999])) == 2
+    flat.remove(np.array([3, 4]))
+    assert len(index) == 198
+    _, found = index.search(vectors[3], 10)
+    assert 3 not in found and 4 not in found
+    assert np.array_equal(found, flat.search(vectors[3], 10)[1])
+
+def test_filtered_search():
+    flat, index, vectors = _indexes(200)
+    subset = np.arange(0, 200, 7)
+    _, found = index.search_subset(vectors[5], subset, 5)
+    assert np.isin(found, subset).all()
+    assert np.array_equal(found, flat.search_subset(vectors[5], subset, 5)[1])
+
+    _, found = index.search_subset_many(vectors[:4], subset, 5)
+    assert np.isin(found, subset).all()
+    assert np.array_equal(found, flat.search_subset_many(vectors[:4], subset, 5)[1])
+
+def test_filtered_search_after_remove():
+    # removing ids shifts the internal positions of the flat index, the filter must follow them
+    flat, index, vectors = _indexes(200)
+    removed = np.arange(0, 100, 2)
+    index.remove(removed)
+    flat.remove(removed)
+    subset = np.arange(0, 200, 3)
+    for query in (vectors[3], vectors[150]):
+        scores, found = index.search_subset(query, subset, 8)
+        expected_scores, expected = flat.search_subset(query, subset, 8)
+        assert not np.isin(found, removed).any()
+        assert np.array_equal(found, expected)
+        assert np.allclose(scores, expected_scores, atol=1e-5)
+
+def test_batched_search_matches_single_queries():
+    _, index, vectors = _indexes(200)
+    queries = vectors[10:20]
+    _, found = index.search_many(queries, 5)
+    assert found.shape == (10, 5)
+    for query, row in zip(queries, found):
+        assert np.array_equal(index.search(query, 5)[1], row)
+
+def test_switches_to_ivf():
+    _, index, vectors = _indexes(999, ivf_threshold=1000)
+    assert not index.is_ivf
+    index.add(np.array([999]), _vectors(1, seed=1))
+    assert index.is_ivf
+    assert len(index) == 1000
+
+    # the vectors and ids survive the rebuild, the nearest neighbour of a stored vector is itself
+    index.nprobe = index.index.nlist
+    index.index.nprobe = index.nprobe
+    _, found = index.search_many(vectors[:20], 1)
+    assert np.array_equal(found[:, 0], np.arange(20))
+    assert index.remove(np.array([0])) == 1
+    _, found = index.search_subset(vectors[0], np.array([0, 1, 2]), 3)
+    assert 0 not in found
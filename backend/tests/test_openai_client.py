@@ -0,0 +1,109 @@
+# shared openai client against a mocked http transport: retries, backoff, concurrency limit, missing key
+import asyncio
+import pytest
+
+openai = pytest.importorskip("openai")
+httpx = pytest.importorskip("httpx")
+from backend.services import openai_client
+from backend.services.openai_client import OpenAIClient
+
+EMBEDDING = {
+    "object": "list",
+    "data": [{"object": "embedding", "index": 0, "embedding": [0.1, 0.2]}],
+    "model": "text-embedding-ada-002",
+    "usage": {"prompt_tokens": 1, "total_tokens": 1},
+}
+
+def _client(handler, **kwargs):
+    return OpenAIClient(api_key="test", base_url="http://openai.test/v1", transport=httpx.MockTransport(handler),
+                        **kwargs)
+
+@pytest.fixture
+def delays(monkeypatch):
+    """ backoff delays of the client, recorded instead of slept """
+    recorded = []
+    async def sleep(delay):
+        recorded.append(delay)
+    monkeypatch.setattr(openai_client.asyncio, "sleep", sleep)
+    return recorded
+
+def test_retries_until_the_attempts_run_out(delays):
+    attempts = []
+    def handler(request):
+        attempts.append(request)
+        return httpx.Response(500, json={"error": {"message": "boom"}})
+
+    async def main():
+        client = _client(handler, max_retries=3, backoff_s=0.5, max_backoff_s=1.0)
+        try:
+            await client.embeddings(model="text-embedding-ada-002", input="text")
+        finally:
+            await client.close()
+
+    with pytest.raises(openai.InternalServerError):
+        asyncio.run(main())
+    assert len(attempts) == 4 # max_retries + 1
+    # full jitter: each delay is drawn below the doubled (and capped) backoff
+    assert len(delays) == 3
+    assert all(0 <= delay <= bound for delay, bound in zip(delays, [0.5, 1.0, 1.0]))
+
+def test_retry_after_is_honoured(delays):
+    responses = [httpx.Response(429, headers={"retry-after": "2"}, json={"error": {"message": "slow down"}}),
+                 httpx.Response(200, json=EMBEDDING)]
+    def handler(request):
+        return responses.pop(0)
+
+    async def main():
+        client = _client(handler, backoff_s=0.01)
+        try:
+            return await client.embeddings(model="text-embedding-ada-002", input="text")
+        finally:
+            await client.close()
+
+    response = asyncio.run(main())
+    assert response.data[0].embedding == [0.1, 0.2]
+    assert not responses
+    assert delays and delays[0] >= 2.0
+
+def test_client_errors_are_not_retried(delays):
+    attempts = []
+    def handler(request):
+        attempts.append(request)
+        return httpx.Response(400, json={"error": {"message": "bad request"}})
+
+    async def main():
+        client = _client(handler)
+        try:
+            await client.embeddings(model="text-embedding-ada-002", input="text")
+        finally:
+            await client.close()
+
+    with pytest.raises(openai.BadRequestError):
+        asyncio.run(main())
+    assert len(attempts) == 1 and not delays
+
+def test_concurrency_stays_within_the_limit():
+    in_flight, peak = [0], [0]
+    async def handler(request):
+        in_flight[0] += 1
+        peak[0] = max(peak[0], in_flight[0])
+        await asyncio.sleep(0.01)
+        in_flight[0] -= 1
+        return httpx.Response(200, json=EMBEDDING)
+
+    async def main():
+        client = _client(handler, max_concurrency=3)
+        try:
+            return await asyncio.gather(*(
+                client.embeddings(model="text-embedding-ada-002", input=f"text {i}") for i in range(12)
+            ))
+        finally:
+            await client.close()
+
+    assert len(asyncio.run(main())) == 12
+    assert peak[0] == 3
+
+def test_missing_api_key(monkeypatch):
+    monkeypatch.delenv("OPENAI_API_KEY", raising=False)
+    with pytest.raises(openai.OpenAIError):
+        OpenAIClient()
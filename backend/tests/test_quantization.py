@@ -0,0 +1,71 @@
+# quantized vector index: recall of int8 and float16 codes against exact search, removal and growth
+import numpy as np
+import pytest
+from backend.services.vector_index import FlatIndex
+from backend.services.vector_quantization import QuantizedIndex, recall_at_k
+
+DIM = 32
+
+def _vectors(count, seed=0):
+    return np.random.default_rng(seed).standard_normal((count, DIM)).astype(np.float32)
+
+def _indexes(count, quantization, capacity=1024):
+    vectors = _vectors(count)
+    ids = np.arange(count) + 1000 # ids aren't row numbers
+    flat, index = FlatIndex(DIM), QuantizedIndex(DIM, quantization=quantization, capacity=capacity)
+    flat.add(ids, vectors)
+    index.add(ids, vectors)
+    return flat, index
+
+def _recall(index, flat, queries, top_k=10):
+    _, found = index.search_many(queries, top_k)
+    _, exact = flat.search_many(queries, top_k)
+    return sum(len(np.intersect1d(f, e)) for f, e in zip(found, exact)) / exact.size
+
+@pytest.mark.parametrize("quantization, min_recall", [("int8", 0.95), ("float16", 0.99)])
+def test_recall_against_flat_index(quantization, min_recall):
+    flat, index = _indexes(2000, quantization)
+    queries = _vectors(50, seed=1)
+    assert _recall(index, flat, queries) >= min_recall
+    assert recall_at_k(index, queries) >= min_recall
+
+    # candidates are re-ranked with the full precision vectors, so scores are exact
+    scores, found = index.search(queries[0], 5)
+    expected_scores, expected = flat.search(queries[0], 5)
+    assert np.array_equal(found, expected)
+    assert np.allclose(scores, expected_scores, atol=1e-5)
+
+def test_codes_are_smaller_than_float32():
+    _, int8 = _indexes(100, "int8")
+    _, half = _indexes(100, "float16")
+    float32_bytes = len(int8.matrix) * DIM * 4
+    assert int8.matrix.dtype == np.int8 and int8.matrix.nbytes * 4 == float32_bytes
+    assert half.matrix.dtype == np.float16 and half.matrix.nbytes * 2 == float32_bytes
+
+@pytest.mark.parametrize("quantization", ["int8", "float16"])
+def test_remove_moves_the_last_row(quantization):
+    flat, index = _indexes(300, quantization)
+    removed = np.array([1000, 1150, 1299, 42]) # the last one isn't stored
+    assert index.remove(removed) == 3
+    flat.remove(removed)
+    assert len(index) == 297
+
+    # the moved rows keep their codes, scales and full precision vectors
+    vectors = _vectors(300)
+    for row in (10, 200, 298):
+        _, found = index.search(vectors[row], 1)
+        assert found[0] == 1000 + row
+    queries = _vectors(20, seed=2)
+    assert _recall(index, flat, queries) >= 0.95
+    assert not np.isin(index.search_many(queries, 10)[1], removed).any()
+    subset = np.array([1001, 1150, 1200, 1298])
+    _, found = index.search_subset(vectors[200], subset, 4)
+    assert found.tolist()[0] == 1200 and 1150 not in found
+
+@pytest.mark.parametrize("quantization", ["int8", "float16"])
+def test_growth_keeps_rows(quantization):
+    flat, index = _indexes(100, quantization, capacity=16)
+    assert len(index.matrix) >= 100
+    vectors = _vectors(100)
+    _, found = index.search_many(vectors, 1)
+    assert found[:, 0].tolist() == list(range(1000, 1100))
@@ -0,0 +1,57 @@
+# search tree checkpoints: round trip through the file in every mmap mode, and resuming a search
+import numpy as np
+import pytest
+from backend.mcts import Search, ExactEvaluator, load_tree, save_tree
+from backend.mcts.benchmark import BenchmarkCase, make_environment
+from backend.mcts.serialize import RECORD
+
+def _search(iterations=2000):
+    game = make_environment(BenchmarkCase("serialize", branching=12, depth=3))
+    search = Search(game, seed=0, evaluator=ExactEvaluator(game), widening_constant=2.0)
+    search.run(max_iterations=iterations)
+    return game, search
+
+@pytest.mark.parametrize("mmap_mode", [None, 'r', 'c'])
+def test_round_trip(tmp_path, mmap_mode):
+    _, search = _search()
+    path = str(tmp_path / "search.tree")
+    save_tree(search.tree, path)
+
+    tree = load_tree(path, mmap_mode=mmap_mode)
+    assert tree.size == search.tree.size
+    assert tree.semantics == search.tree.semantics
+    assert tree.actions == search.tree.actions
+    assert tree.garbage == search.tree.garbage
+    for name in RECORD.names:
+        assert np.array_equal(getattr(tree, name)[:tree.size], getattr(search.tree, name)[:tree.size]), name
+    assert tree.most_visited_child(0) == search.tree.most_visited_child(0)
+
+def test_read_only_map_rejects_writes(tmp_path):
+    _, search = _search()
+    path = str(tmp_path / "search.tree")
+    save_tree(search.tree, path)
+
+    tree = load_tree(path, mmap_mode='r')
+    with pytest.raises(ValueError):
+        tree.visits[0] = 0
+
+def test_copy_on_write_leaves_file_untouched(tmp_path):
+    _, search = _search()
+    path = str(tmp_path / "search.tree")
+    save_tree(search.tree, path)
+
+    tree = load_tree(path, mmap_mode='c')
+    tree.visits[0] = 0
+    assert load_tree(path).visits[0] == search.tree.visits[0]
+
+def test_resume_search(tmp_path):
+    game, search = _search()
+    path = str(tmp_path / "search.tree")
+    search.save(path)
+
+    resumed = Search.load(path, game, evaluator=ExactEvaluator(game), widening_constant=2.0)
+    visits = int(resumed.tree.visits[0])
+    assert visits == search.tree.visits[0]
+    result = resumed.run(max_iterations=500)
+    assert resumed.tree.visits[0] == visits + result.iterations
+    assert result.best_paths
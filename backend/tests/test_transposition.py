@@ -0,0 +1,113 @@
+# transposition table keys and slots, and moving children when a node widens
+import numpy as np
+from backend.mcts.tree import Tree
+from backend.mcts.transposition import TranspositionTable
+
+def _path(tree, actions):
+    """ node indices from the root following the actions (children are expanded on the way) """
+    path = [0]
+    for action in actions:
+        children = tree.children(path[-1])
+        names = [tree.actions[a] for a in tree.action[children]]
+        if action not in names:
+            children = tree.add_children(path[-1], [action])
+            names = [tree.actions[a] for a in tree.action[children]]
+        path.append(int(children[names.index(action)]))
+    return path
+
+def test_multiset_keys_ignore_order():
+    tree = Tree(semantics="multiset")
+    ab, ba = _path(tree, ["a", "b"]), _path(tree, ["b", "a"])
+    assert tree.key[ab[-1]] == tree.key[ba[-1]]
+    assert tree.key[ab[1]] != tree.key[ba[1]]
+
+def test_sequence_keys_follow_order():
+    tree = Tree(semantics="sequence")
+    ab, ba = _path(tree, ["a", "b"]), _path(tree, ["b", "a"])
+    assert tree.key[ab[-1]] != tree.key[ba[-1]]
+
+def test_transposed_nodes_share_statistics():
+    tree = Tree(semantics="multiset")
+    table = TranspositionTable(max_entries=16)
+    ab, ba = _path(tree, ["a", "b"]), _path(tree, ["b", "a"])
+    table.update(tree, ab, np.array([3.0, 3.0, 2.0]))
+
+    # b -> a reaches the state a -> b already visited
+    assert table.lookup(tree, ba[-1]) == 2.0
+    assert tree.slot[ba[-1]] == tree.slot[ab[-1]]
+    visits, _ = table.shared_stats(tree, ba[-1], ba[-1] + 1)
+    assert visits[0] == 1
+
+def test_evicted_slot_is_not_reused_for_the_old_state():
+    tree = Tree(semantics="sequence")
+    table = TranspositionTable(max_entries=4, evict_fraction=0.5)
+    first = _path(tree, ["a"])
+    table.update(tree, first, np.array([1.0, 1.0]))
+    slot = int(tree.slot[first[-1]])
+    old_key = int(tree.key[first[-1]])
+
+    # fill the table so the oldest entries (the root and "a") are evicted and their slots handed out again
+    for action in ["b", "c", "d", "e"]:
+        table.update(tree, _path(tree, [action]), np.array([5.0, 5.0]))
+    assert table.evictions > 0
+    assert old_key not in table._slots
+    assert table.lookup(tree, first[-1]) is None
+
+    # the node still points at its old slot, which now holds another state: its own statistics are used
+    assert tree.slot[first[-1]] == slot
+    assert not table._valid(tree, np.array([first[-1]]))[0]
+    tree.visits[first[-1]] = 7
+    visits, _ = table.shared_stats(tree, first[-1], first[-1] + 1)
+    assert visits[0] == 7
+    assert tree.slot[first[-1]] == -1
+
+    # updating the node again gives it a fresh entry
+    table.update(tree, first, np.array([1.0, 1.0]))
+    assert table._valid(tree, np.array(first)).all()
+    assert table.keys[tree.slot[first[-1]]] == tree.key[first[-1]]
+
+def test_clear_drops_every_entry():
+    tree = Tree()
+    table = TranspositionTable(max_entries=8)
+    path = _path(tree, ["a", "b"])
+    table.update(tree, path, np.array([1.0, 1.0, 1.0]))
+    table.clear()
+    assert len(table) == 0
+    assert table.lookup(tree, path[-1]) is None
+
+def test_add_children_relocates_and_keeps_statistics():
+    tree = Tree(semantics="sequence")
+    children = tree.add_children(0, ["a", "b"])
+    grandchildren = tree.add_children(int(children[1]), ["x", "y"])
+    tree.visits[children] = [3, 4]
+    tree.value[children] = [1.5, 2.5]
+    tree.visits[grandchildren] = [1, 2]
+    keys = tree.key[children].copy()
+    capacity = int(tree.child_capacity[0])
+
+    # no room left: the children move to a new range with double the room
+    moved = tree.add_children(0, ["c"])
+    assert len(moved) == 3
+    assert moved[0] != children[0]
+    assert tree.child_capacity[0] == 2 * capacity
+    assert tree.garbage == capacity
+    assert [tree.actions[a] for a in tree.action[moved]] == ["a", "b", "c"]
+    assert tree.visits[moved].tolist() == [3, 4, 0]
+    assert tree.value[moved[:2]].tolist() == [1.5, 2.5]
+    assert (tree.key[moved[:2]] == keys).all()
+    assert (tree.parent[moved] == 0).all()
+
+    # the grandchildren stay where they are and point at their moved parent
+    b = int(moved[1])
+    assert tree.children(b).tolist() == grandchildren.tolist()
+    assert (tree.parent[grandchildren] == b).all()
+    assert tree.path_actions(int(grandchildren[1])) == ["b", "y"]
+
+    # a path recorded before the move is found again by its actions
+    action_ids = tree.action[[int(children[1]), int(grandchildren[1])]].tolist()
+    assert tree.locate(action_ids) == [0, b, int(grandchildren[1])]
+
+    # the next child fits in the reserved room without moving again
+    again = tree.add_children(0, ["d"])
+    assert again[0] == moved[0]
+    assert tree.garbage == capacity
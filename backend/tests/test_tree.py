@@ -0,0 +1,98 @@
+# struct-of-arrays search tree: backpropagation, merge and subtract of parallel workers, collapse and extract
+import numpy as np
+from backend.mcts import Search, ExactEvaluator, Tree
+from backend.mcts.benchmark import BenchmarkCase, make_environment
+
+def _search(tree=None, iterations=300, seed=0):
+    game = make_environment(BenchmarkCase("tree", branching=6, depth=3))
+    search = Search(game, seed=seed, evaluator=ExactEvaluator(game))
+    if tree is not None:
+        search.tree = tree
+    search.run(max_iterations=iterations)
+    return search
+
+def _reachable(tree):
+    """ (action path, node) of every node reachable from the root """
+    nodes = {(): 0}
+    stack = [((), 0)]
+    while stack:
+        path, node = stack.pop()
+        for child in tree.children(node).tolist():
+            child_path = path + (tree.actions[tree.action[child]],)
+            nodes[child_path] = child
+            stack.append((child_path, child))
+    return nodes
+
+def _stats(tree):
+    return {path: (int(tree.visits[node]), float(tree.value[node])) for path, node in _reachable(tree).items()}
+
+def test_backpropagate_credits_the_return_from_each_node():
+    tree = Tree()
+    a = int(tree.add_children(0, ["a", "b"])[0])
+    ab = int(tree.add_children(a, ["b"])[0])
+    returns = tree.backpropagate([0, a, ab], rewards=[1.0, 2.0], leaf_value=0.5)
+    assert returns.tolist() == [3.5, 3.5, 2.5]
+    assert tree.visits[[0, a, ab]].tolist() == [1, 1, 1]
+    assert tree.value[[0, a, ab]].tolist() == [3.5, 3.5, 2.5]
+    assert tree.visits[a + 1] == 0
+
+def test_visits_add_up_after_a_search():
+    search = _search()
+    tree = search.tree
+    assert tree.visits[0] == 300
+    for node in _reachable(tree).values():
+        if tree.child_count[node] and not tree.done[node]:
+            # every simulation through a node continues into one of its children, except the one that expanded it
+            assert tree.visits[tree.children(node)].sum() in (tree.visits[node], tree.visits[node] - 1)
+
+def test_subtract_then_merge_round_trip():
+    seed = _search(iterations=200).tree
+    grown = _search(tree=seed.extract(0, capacity=seed.size), iterations=300, seed=1).tree
+    expected = _stats(grown)
+
+    # the worker sends back only what it added to the seed, merging it into the seed gives the grown tree
+    grown.subtract(seed)
+    assert grown.visits[0] == 300
+    merged = seed.extract(0, capacity=seed.size)
+    merged.merge(grown)
+    stats = _stats(merged)
+    assert stats.keys() == expected.keys()
+    for path, (visits, value) in expected.items():
+        assert stats[path][0] == visits, path
+        assert np.isclose(stats[path][1], value), path
+
+def test_merge_of_independent_trees_sums_statistics():
+    first, second = _search(seed=1).tree, _search(seed=2).tree
+    merged = first.extract(0, capacity=first.size)
+    merged.merge(second)
+    stats, ours, theirs = _stats(merged), _stats(first), _stats(second)
+    assert merged.visits[0] == 600
+    for path in stats:
+        assert stats[path][0] == ours.get(path, (0, 0.0))[0] + theirs.get(path, (0, 0.0))[0], path
+
+def test_collapse_then_extract_keeps_the_reachable_subtree():
+    tree = _search(iterations=500).tree
+    before = _stats(tree)
+    dropped = tree.collapse(max_nodes=40)
+    assert dropped > 0
+    reachable = _stats(tree)
+    assert len(reachable) <= 40
+    assert len(reachable) == len(before) - dropped
+    # collapsed nodes keep their own statistics as a summary of their subtree
+    assert all(before[path] == stats for path, stats in reachable.items())
+
+    compact = tree.extract(0)
+    assert compact.size == len(reachable)
+    assert compact.garbage == 0
+    assert _stats(compact) == reachable
+
+def test_extract_subtree_rebases_depths():
+    tree = _search().tree
+    child = tree.most_visited_child(0)
+    action = tree.actions[tree.action[child]]
+    subtree = tree.extract(child)
+    assert subtree.visits[0] == tree.visits[child]
+    assert subtree.depth[0] == 0
+    assert (subtree.depth[subtree.children(0)] == 1).all()
+    expected = {path[1:]: stats for path, stats in _stats(tree).items() if path[:1] == (action,)}
+    assert _stats(subtree) == expected
@@ -0,0 +1,102 @@
+# persisted vector store files: reopening, crash recovery, the writer lock and read-only refresh
+import os
+import numpy as np
+import pytest
+from backend.services.vector_persistence import VectorFiles, MetadataLog, MappedFlatIndex, METADATA, fcntl
+
+DIM = 8
+
+def _vectors(count, seed=0):
+    return np.random.default_rng(seed).standard_normal((count, DIM)).astype(np.float32)
+
+def _open(path, readonly=False):
+    files = VectorFiles(str(path), readonly=readonly)
+    index = MappedFlatIndex(files, DIM)
+    return files, MetadataLog(files), index
+
+def _add(files, metadata, index, vectors, commit=True):
+    records = [{"text": f"memory {len(metadata) + i}"} for i in range(len(vectors))]
+    index.add(np.arange(len(metadata), len(metadata) + len(vectors)), vectors, records=records)
+    for record in records:
+        metadata.append(record)
+    if commit:
+        files.commit()
+
+def test_reopen_after_commit(tmp_path):
+    files, metadata, index = _open(tmp_path)
+    vectors = _vectors(20)
+    _add(files, metadata, index, vectors)
+    index.remove(np.array([4]))
+    metadata[4] = None
+    files.commit()
+    files.close()
+
+    files, metadata, index = _open(tmp_path)
+    assert files.rows == 20 and len(metadata) == 20 and len(index) == 19
+    assert metadata[7] == {"text": "memory 7"}
+    assert metadata[4] is None
+    _, found = index.search(vectors[7], 3)
+    assert found[0] == 7 and 4 not in index.search(vectors[4], 20)[1]
+
+def test_uncommitted_tail_is_dropped(tmp_path):
+    files, metadata, index = _open(tmp_path)
+    _add(files, metadata, index, _vectors(10))
+    committed = os.path.getsize(tmp_path / METADATA)
+    # crash after writing rows and a deletion but before their commit
+    _add(files, metadata, index, _vectors(5, seed=1), commit=False)
+    index.remove(np.array([2]))
+    files.close()
+
+    files, metadata, index = _open(tmp_path)
+    assert files.rows == 10 and len(index) == 10
+    assert os.path.getsize(tmp_path / METADATA) == committed
+    assert metadata[2] is not None
+
+    # rows written after recovery get the ids and metadata offsets of the dropped ones
+    _add(files, metadata, index, _vectors(3, seed=2))
+    files.close()
+    files, metadata, _ = _open(tmp_path)
+    assert files.rows == 13
+    assert [metadata[idx]["text"] for idx in range(13)] == [f"memory {idx}" for idx in range(13)]
+
+@pytest.mark.skipif(fcntl is None, reason="writers are only locked where fcntl exists")
+def test_second_writer_opens_read_only(tmp_path):
+    files, metadata, index = _open(tmp_path)
+    _add(files, metadata, index, _vectors(5))
+
+    second = VectorFiles(str(tmp_path))
+    assert second.readonly and second.rows == 5
+
+    files.close()
+    third = VectorFiles(str(tmp_path))
+    assert not third.readonly
+    third.close()
+
+def test_refresh_sees_new_commits(tmp_path):
+    files, metadata, index = _open(tmp_path)
+    _add(files, metadata, index, _vectors(10))
+    reader, reader_metadata, reader_index = _open(tmp_path, readonly=True)
+    assert not reader.refresh()
+
+    # in place appends, a deletion, then a growth into a new generation of the arrays
+    vectors = _vectors(5, seed=1)
+    _add(files, metadata, index, vectors)
+    index.remove(np.array([3]))
+    metadata[3] = None
+    files.commit()
+    assert reader.refresh()
+    reader_metadata.refresh()
+    reader_index.refresh()
+    assert len(reader_metadata) == 15 and reader_metadata[3] is None
+    assert reader_metadata[12] == {"text": "memory 12"}
+    assert reader_index.search(vectors[2], 1)[1][0] == 12
+    assert 3 not in reader_index.search(_vectors(10)[3], 15)[1]
+
+    grown = _vectors(VectorFiles.min_capacity, seed=2)
+    _add(files, metadata, index, grown)
+    assert reader.refresh()
+    reader_metadata.refresh()
+    reader_index.refresh()
+    assert len(reader_metadata) == 15 + len(grown) and len(reader_index) == 14 + len(grown)
+    assert reader_index.search(grown[-1], 1)[1][0] == 14 + len(grown)
+    files.close()